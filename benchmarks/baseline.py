@@ -0,0 +1,184 @@
+import tempfile, zlib
+from collections import OrderedDict
+from struct import unpack
+
+from pydofus._binarystream import _BinaryStream
+from pydofus.dlm import Map
+
+# copy of the readers as they were before the optimizations, so the
+# benchmarks measure the gains against the original code
+
+
+class _BaselineStream(_BinaryStream):
+    """_BinaryStream unpacking with a format string per read"""
+    def _unpack(self, fmt, length=1):
+        bytes = self.read_bytes(length)
+        if self._big_endian:
+            fmt = ">" + fmt
+        else:
+            fmt = "<" + fmt
+        return unpack(fmt, bytes)[0]
+
+
+def read_dlm(stream, key):
+    """DLM.read through a temporary file"""
+    dlm_uncompressed = tempfile.TemporaryFile()
+    dlm_uncompressed.write(zlib.decompress(stream.read()))
+    dlm_uncompressed.seek(0)
+
+    DLM_file_binary = _BaselineStream(dlm_uncompressed, True)
+
+    map = Map(DLM_file_binary, key)
+    map.read()
+
+    dlm_uncompressed.close()
+
+    return map.getObj()
+
+
+class D2OReader:
+    """D2OReader reading the objects field by field from the stream"""
+    def __init__(self, stream):
+        self._stream = stream
+
+        self._stream_start_index = 7
+        self._classes = OrderedDict()
+        self._counter = 0
+
+        D2O_file_binary = _BaselineStream(self._stream, True)
+        self._D2O_file_binary = D2O_file_binary
+
+        D2O_file_binary.read_bytes(3)
+        offset = D2O_file_binary.read_int32()
+        self._stream.seek(offset)
+        index_number = D2O_file_binary.read_int32()
+        index = 0
+
+        while index < index_number:
+            D2O_file_binary.read_int32()
+            D2O_file_binary.read_int32()
+            self._counter += 1
+            index = index + 8
+
+        class_number = D2O_file_binary.read_int32()
+        class_index = 0
+
+        while class_index < class_number:
+            class_id = D2O_file_binary.read_int32()
+            self._read_class_definition(class_id, D2O_file_binary)
+            class_index += 1
+
+    def get_objects(self):
+        counter = self._counter
+        classes = self._classes
+        D2O_file_binary = self._D2O_file_binary
+        D2O_file_binary.position(self._stream_start_index)
+        objects = list()
+        i = 0
+        while i < counter:
+            objects.append(
+                classes[D2O_file_binary.read_int32()].read(D2O_file_binary))
+            i += 1
+        return objects
+
+    def get_class_definition(self, object_id):
+        return self._classes[object_id]
+
+    def _read_class_definition(self, class_id, D2O_file_binary):
+        D2O_file_binary.read_string()
+        D2O_file_binary.read_string()
+        class_def = _GameDataClassDefinition(self)
+        field_number = D2O_file_binary.read_int32()
+        field_index = 0
+
+        while field_index < field_number:
+            field = D2O_file_binary.read_string()
+            class_def.add_field(field, D2O_file_binary)
+            field_index += 1
+
+        self._classes[class_id] = class_def
+
+
+class _GameDataClassDefinition:
+    def __init__(self, d2o_reader):
+        self._fields = list()
+        self._d2o_reader = d2o_reader
+
+    def read(self, D2O_file_binary):
+        obj = OrderedDict()
+        for field in self._fields:
+            obj[field.name] = field.read_data(D2O_file_binary)
+        return obj
+
+    def add_field(self, name, D2O_file_binary):
+        field = _GameDataField(name, self._d2o_reader)
+        field.read_type(D2O_file_binary)
+        self._fields.append(field)
+
+
+class _GameDataField:
+    def __init__(self, name, d2o_reader):
+        self.name = name.decode('utf-8')
+        self._inner_read_methods = list()
+        self._d2o_reader = d2o_reader
+
+    def read_type(self, D2O_file_binary):
+        read_id = D2O_file_binary.read_int32()
+        self.read_data = self._get_read_method(read_id, D2O_file_binary)
+
+    def _get_read_method(self, read_id, D2O_file_binary):
+        if read_id == -1:
+            return self._read_integer
+        elif read_id == -2:
+            return self._read_boolean
+        elif read_id == -3:
+            return self._read_string
+        elif read_id == -4:
+            return self._read_number
+        elif read_id == -5:
+            return self._read_i18n
+        elif read_id == -6:
+            return self._read_unsigned_integer
+        elif read_id == -99:
+            D2O_file_binary.read_string()
+            self._inner_read_methods = [self._get_read_method(
+                D2O_file_binary.read_int32(),
+                D2O_file_binary)] + self._inner_read_methods
+            return self._read_vector
+        else:
+            return self._read_object
+
+    def _read_integer(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_int32()
+
+    def _read_boolean(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_bool()
+
+    def _read_string(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_string().decode('utf-8')
+
+    def _read_number(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_double()
+
+    def _read_i18n(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_int32()
+
+    def _read_unsigned_integer(self, D2O_file_binary, vec_index=0):
+        return D2O_file_binary.read_uint32()
+
+    def _read_vector(self, D2O_file_binary, vec_index=0):
+        vector_size = D2O_file_binary.read_int32()
+        vector = list()
+        i = 0
+        while i < vector_size:
+            vector.append(self._inner_read_methods[vec_index](D2O_file_binary,
+                                                              vec_index + 1))
+            i += 1
+        return vector
+
+    def _read_object(self, D2O_file_binary, vec_index=0):
+        object_id = D2O_file_binary.read_int32()
+        if object_id == -1431655766:
+            return None
+        obj = self._d2o_reader.get_class_definition(object_id)
+        return obj.read(D2O_file_binary)
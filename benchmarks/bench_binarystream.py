@@ -0,0 +1,175 @@
+import io, os, sys, timeit, zlib
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pydofus._binarystream import _BinaryStream, _BinaryBuffer
+from pydofus.dlm import DLM
+from pydofus.d2o import D2OReader
+import baseline
+
+# python benchmarks/bench_binarystream.py
+# compare the original readers (before, copied in baseline.py) and the
+# current ones (after) on synthetic files
+
+
+def synthetic_dlm():
+    """Compressed, unencrypted version 9 map with 5 graphical elements per
+    cell on 2 layers"""
+    data = io.BytesIO()
+    raw = _BinaryStream(data, True)
+
+    raw.write_char(77)
+    raw.write_char(9)
+    raw.write_uint32(1)
+    raw.write_bool(False)
+    raw.write_char(0)
+    raw.write_int32(0)
+    raw.write_uint32(0)
+    raw.write_char(0)
+    for value in (1, 2, 3, 4, 5):
+        raw.write_int32(value)
+    raw.write_uint32(0)
+    raw.write_int32(0)
+    raw.write_uint32(0)
+    raw.write_uint16(100)
+    raw.write_int16(0)
+    raw.write_int16(0)
+    raw.write_bool(False)
+    raw.write_bool(False)
+    raw.write_char(0)
+    raw.write_char(0)
+    raw.write_int32(0)
+    raw.write_int32(0)
+
+    raw.write_char(2)
+    for layer in range(2):
+        raw.write_char(layer)
+        raw.write_int16(560)
+        for cell in range(560):
+            raw.write_int16(cell)
+            raw.write_int16(5)
+            for element in range(5):
+                raw.write_char(2)
+                raw.write_uint32(element)
+                for i in range(6):
+                    raw.write_char(0)
+                raw.write_int16(0)
+                raw.write_int16(0)
+                raw.write_char(0)
+                raw.write_uint32(element)
+
+    for cell in range(560):
+        raw.write_char(0)
+        raw.write_int16(0)
+        raw.write_char(0)
+        raw.write_char(0)
+        raw.write_uchar(0)
+
+    return zlib.compress(data.getvalue())
+
+
+def synthetic_d2o(count=20000):
+    """D2O with one class of scalar fields, a string and an int vector"""
+    objects = io.BytesIO()
+    raw = _BinaryStream(objects, True)
+
+    offsets = []
+    for i in range(count):
+        offsets.append(7 + objects.tell())
+        raw.write_int32(1)
+        raw.write_int32(i)
+        raw.write_int32(i * 10)
+        raw.write_uint32(i)
+        raw.write_bool(i % 2 == 0)
+        raw.write_double(i / 3)
+        raw.write_string(("item_" + str(i)).encode())
+        raw.write_int32(4)
+        for j in range(4):
+            raw.write_int32(j)
+
+    data = io.BytesIO()
+    raw = _BinaryStream(data, True)
+    raw.write_bytes(b"D2O")
+    raw.write_int32(7 + len(objects.getvalue()))
+    raw.write_bytes(objects.getvalue())
+
+    raw.write_int32(count * 8)
+    for i, offset in enumerate(offsets):
+        raw.write_int32(i)
+        raw.write_int32(offset)
+
+    raw.write_int32(1)
+    raw.write_int32(1)
+    raw.write_string(b"Item")
+    raw.write_string(b"com.ankamagames.dofus.datacenter.items")
+    fields = [(b"id", -1), (b"nameId", -5), (b"level", -6),
+              (b"usable", -2), (b"weight", -4), (b"iconId", -3)]
+    raw.write_int32(len(fields) + 1)
+    for name, type_ in fields:
+        raw.write_string(name)
+        raw.write_int32(type_)
+    raw.write_string(b"possibleEffects")
+    raw.write_int32(-99)
+    raw.write_string(b"Vector.<int>")
+    raw.write_int32(-1)
+
+    return data.getvalue(), count
+
+
+def decode_d2o(reader, raw, count):
+    """Field by field decoding, as the compiled decoders are used by
+    _GameDataClassDefinition.read for a _BinaryBuffer"""
+    classes = reader._classes
+    raw.position(reader._stream_start_index)
+    objects = list()
+    for i in range(count):
+        obj = OrderedDict()
+        for field in classes[raw.read_int32()]._fields:
+            obj[field.name] = field.read_data(raw)
+        objects.append(obj)
+    return objects
+
+
+def bench(name, before, after, number):
+    time_before = min(timeit.repeat(before, number=number, repeat=3))
+    time_after = min(timeit.repeat(after, number=number, repeat=3))
+    print("%-4s before: %8.2f ms  after: %8.2f ms  speedup: x%.2f" % (
+        name, time_before * 1000 / number, time_after * 1000 / number,
+        time_before / time_after))
+
+
+if __name__ == "__main__":
+    dlm = synthetic_dlm()
+    bench("DLM",
+          lambda: baseline.read_dlm(io.BytesIO(dlm), ""),
+          lambda: DLM(io.BytesIO(dlm), "").read(),
+          10)
+
+    # Field by field decoding, from the stream and from the buffer
+    d2o, count = synthetic_d2o()
+    reader = D2OReader(io.BytesIO(d2o))
+    baseline_reader = baseline.D2OReader(io.BytesIO(d2o))
+    bench("D2O",
+          baseline_reader.get_objects,
+          lambda: decode_d2o(reader, _BinaryBuffer(d2o, True), count),
+          1)
+
+    # Compiled per-class decoders against the field by field decoding of
+    # the same buffer
+    bench("D2OC",
+          lambda: decode_d2o(reader, _BinaryBuffer(d2o, True), count),
+          reader.get_objects,
+          1)
+
+    # Original reader against the compiled decoders, building OrderedDicts
+    # (D2OB) or D2ORecords in compact mode (D2OK)
+    bench("D2OB",
+          baseline_reader.get_objects,
+          reader.get_objects,
+          1)
+    compact_reader = D2OReader(io.BytesIO(d2o), compact=True)
+    bench("D2OK",
+          baseline_reader.get_objects,
+          compact_reader.get_objects,
+          1)
@@ -0,0 +1,66 @@
+import sys, os, json
+from collections import OrderedDict
+from pydofus.d2o import D2OReader, InvalidD2OFile
+
+# python d2o_diff.py {old folder} {new folder}
+# compare the d2o files with the same name in both folders
+# python d2o_diff.py {old file.d2o} {new file.d2o}
+# file output: ./output/d2o_diff.json (added, removed and changed objects by id)
+
+path_output = "./output/"
+
+
+def diff_file(old_path, new_path):
+    old_file = open(old_path, "rb")
+    new_file = open(new_path, "rb")
+
+    try:
+        return D2OReader(old_file).diff(D2OReader(new_file))
+    finally:
+        old_file.close()
+        new_file.close()
+
+
+def diff_folders(old_folder, new_folder):
+    old_files = set(file for file in os.listdir(old_folder) if file.endswith(".d2o"))
+    new_files = set(file for file in os.listdir(new_folder) if file.endswith(".d2o"))
+
+    diff = OrderedDict()
+
+    for file in sorted(old_files & new_files):
+        try:
+            result = diff_file(os.path.join(old_folder, file),
+                               os.path.join(new_folder, file))
+        except InvalidD2OFile:
+            continue
+
+        print("D2O Diff " + file + ": " + str(len(result["added"])) + " added, " +
+              str(len(result["removed"])) + " removed, " +
+              str(len(result["changed"])) + " changed")
+        diff[file] = result
+
+    for file in sorted(old_files ^ new_files):
+        print("D2O Diff " + file + ": only in " +
+              (new_folder if file in new_files else old_folder))
+
+    return diff
+
+
+if __name__ == "__main__":
+    try:
+        old = sys.argv[1]
+        new = sys.argv[2]
+    except:
+        old = new = None
+
+    if old is None or new is None:
+        print("usage: python d2o_diff.py {old folder|file.d2o} {new folder|file.d2o}")
+    else:
+        if os.path.isdir(old) and os.path.isdir(new):
+            diff = diff_folders(old, new)
+        else:
+            diff = diff_file(old, new)
+
+        json_output = open(path_output + "d2o_diff.json", "w")
+        json.dump(diff, json_output, indent=4)
+        json_output.close()
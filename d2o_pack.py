@@ -0,0 +1,76 @@
+import sys, os, json
+from collections import OrderedDict
+from pydofus.d2o import D2OReader, D2OBuilder, InvalidD2OFile
+
+# python d2o_pack.py file.d2o (require original file in input folder and unpacked file in output folder)
+# file output: ./output/~generated/file.d2o
+# class definitions and the list of queryable fields are taken from the
+# original file, objects from ./output/file.json (or file.jsonl), ids from
+# their id field or else from the object at the same place in the original
+# file, as unpacked by d2o_unpack; objects keep their class in the original
+# file, search tables are regenerated from the objects
+
+path_input = "./input/"
+path_output = "./output/"
+
+try:
+    file = sys.argv[1]
+except:
+    file = None
+
+if file is None:
+    print("usage: python d2o_pack.py {file.d2o}")
+else:
+    print("D2O Packer for " + file)
+
+    try:
+        os.stat(path_output + "~generated")
+    except:
+        os.mkdir(path_output + "~generated")
+
+    d2o_input = open(path_input + file, "rb")
+
+    try:
+        d2o_template = D2OReader(d2o_input)
+        ids = d2o_template.ids(file_order=True)
+
+        json_path = path_output + file.replace("d2o", "json")
+        if os.path.exists(json_path):
+            json_input = open(json_path, "r", encoding="utf-8")
+            objects = json.load(json_input, object_pairs_hook=OrderedDict)
+        else:
+            json_input = open(json_path + "l", "r", encoding="utf-8")
+            objects = [json.loads(line, object_pairs_hook=OrderedDict)
+                       for line in json_input]
+        json_input.close()
+
+        object_ids = list()
+        for i, object_ in enumerate(objects):
+            if "id" in object_:
+                object_ids.append(object_["id"])
+            elif i < len(ids):
+                object_ids.append(ids[i])
+            else:
+                raise ValueError("Object " + str(i) + " has no id field and "
+                                 "the original file has only " +
+                                 str(len(ids)) + " objects.")
+
+        d2o_output = open(path_output + "~generated/" + file, "wb")
+        d2o_builder = D2OBuilder(d2o_template, d2o_output)
+
+        for object_id, object_ in zip(object_ids, objects):
+            if object_id in d2o_template:
+                d2o_builder.add_object(
+                    object_, object_id,
+                    d2o_template.get_object_class_id(object_id))
+            else:
+                d2o_builder.add_object(object_, object_id)
+
+        d2o_builder.build()
+        d2o_output.close()
+    except InvalidD2OFile:
+        print("Invalid D2O file: " + file)
+    except ValueError as error:
+        print("Invalid unpacked file: " + str(error))
+
+    d2o_input.close()
@@ -1,26 +1,105 @@
 import io, sys, os, json
-from pydofus.d2o import D2OReader, InvalidD2OFile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pydofus.d2o import D2OReader, D2OSchemaRegistry, InvalidD2OFile
 
-# python d2o_unpack.py (all files in input folder)
+# python d2o_unpack.py [json|jsonl] [processes] [workers] (all files in input folder)
 # folder output: ./output/{all files}
+# objects are written one at a time, as a JSON array (default: json)
+# or one object per line (jsonl)
+# files are exported by a pool of processes (default: CPUs / workers); with
+# more than one worker, the objects of a file are decoded by a pool of workers
+# and written chunk by chunk in the order of the file
+# the class definitions are cached in ./output/~d2o_schemas.json for the next runs
 
 path_input = "./input/"
 path_output = "./output/"
+path_registry = path_output + "~d2o_schemas.json"
+registry = None
 
-for file in os.listdir(path_input):
-    if file.endswith(".d2o"):
-        file_name = os.path.basename(file)
-        d2p_file = open(path_input + file, "rb")
 
-        print("D2O Unpacker for " + file_name)
+def write_json(objects, output):
+    """Write the objects like json.dump(list(objects), output, indent=4)"""
+    separator = "[\n    "
+    for obj in objects:
+        output.write(separator)
+        output.write(json.dumps(obj, indent=4).replace("\n", "\n    "))
+        separator = ",\n    "
+    output.write("[]" if separator.startswith("[") else "\n]")
 
-        try:
-            d2o_reader = D2OReader(d2p_file)
-            d2o_data = d2o_reader.get_objects()
 
-            json_output = open(path_output + file_name.replace("d2o", "json"),
-                               "w")
-            json.dump(d2o_data, json_output, indent=4)
-            json_output.close()
-        except InvalidD2OFile:
-            pass
+def write_json_lines(objects, output):
+    for obj in objects:
+        output.write(json.dumps(obj))
+        output.write("\n")
+
+
+def export_file(file_name, output_format, workers=1):
+    global registry
+    if registry is None:
+        registry = D2OSchemaRegistry(path_registry)
+
+    d2o_file = open(path_input + file_name, "rb")
+
+    try:
+        d2o_reader = D2OReader(d2o_file, registry)
+        if workers > 1:
+            objects = d2o_reader.iter_objects_parallel(workers)
+        else:
+            objects = d2o_reader.iter_objects()
+
+        json_output = open(path_output + file_name.replace("d2o", output_format),
+                           "w")
+        if output_format == "jsonl":
+            write_json_lines(objects, json_output)
+        else:
+            write_json(objects, json_output)
+        json_output.close()
+        registry.save()
+        return len(d2o_reader)
+    except InvalidD2OFile:
+        return 0
+    finally:
+        d2o_file.close()
+
+
+if __name__ == "__main__":
+    try:
+        output_format = sys.argv[1]
+    except:
+        output_format = "json"
+
+    if output_format not in ("json", "jsonl"):
+        print("Unknown format: " + output_format + " (json or jsonl)")
+        sys.exit(1)
+
+    try:
+        workers = int(sys.argv[3])
+    except:
+        workers = 1
+
+    # Each process runs its own pool of workers, keep one worker per CPU
+    try:
+        processes = int(sys.argv[2])
+    except:
+        processes = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    # Compile the decoders of the known classes once, for the processes
+    # forked by the pools
+    registry = D2OSchemaRegistry(path_registry)
+    registry.compile()
+
+    files = [file for file in os.listdir(path_input) if file.endswith(".d2o")]
+    exported = 0
+
+    with ProcessPoolExecutor(processes) as pool:
+        futures = dict((pool.submit(export_file, file_name, output_format,
+                                    workers), file_name)
+                       for file_name in files)
+
+        for done, future in enumerate(as_completed(futures), 1):
+            count = future.result()
+            exported += count
+            print("D2O Unpacker [" + str(done) + "/" + str(len(files)) + "] " +
+                  futures[future] + ": " + str(count) + " objects")
+
+    print("exported " + str(exported) + " objects from " + str(len(files)) + " files")
@@ -0,0 +1,105 @@
+import sys, os, json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pydofus.d2p import D2PReader, D2PFileSystem, InvalidD2PFile
+
+# python d2p_diff.py {old folder} {new folder} [processes]
+# compare the d2p files with the same name in both folders, in parallel
+# python d2p_diff.py {old file.d2p} {new file.d2p}
+# compare the chains of d2p linked from both files
+# file output: ./output/d2p_diff.json
+
+path_output = "./output/"
+
+
+def diff_archive(old_path, new_path):
+    old_file = open(old_path, "rb")
+    new_file = open(new_path, "rb")
+
+    try:
+        old_reader = D2PReader(old_file, False, True)
+        new_reader = D2PReader(new_file, False, True)
+        manifest = old_reader.diff(new_reader)
+        old_reader.close()
+        new_reader.close()
+        return manifest
+    finally:
+        old_file.close()
+        new_file.close()
+
+
+def list_archive(path):
+    d2p_file = open(path, "rb")
+
+    try:
+        return list(D2PReader(d2p_file, False).files)
+    finally:
+        d2p_file.close()
+
+
+def diff_folders(old_folder, new_folder, processes):
+    old_archives = set(file for file in os.listdir(old_folder) if file.endswith(".d2p"))
+    new_archives = set(file for file in os.listdir(new_folder) if file.endswith(".d2p"))
+
+    diff = OrderedDict()
+
+    with ProcessPoolExecutor(processes) as pool:
+        futures = OrderedDict()
+        for file in sorted(old_archives | new_archives):
+            if file in old_archives and file in new_archives:
+                futures[file] = pool.submit(diff_archive, os.path.join(old_folder, file),
+                                            os.path.join(new_folder, file))
+            elif file in new_archives:
+                futures[file] = pool.submit(list_archive, os.path.join(new_folder, file))
+            else:
+                futures[file] = pool.submit(list_archive, os.path.join(old_folder, file))
+
+        for file, future in futures.items():
+            try:
+                result = future.result()
+            except InvalidD2PFile:
+                continue
+
+            if isinstance(result, list):
+                manifest = OrderedDict([("added", []), ("removed", []), ("modified", [])])
+                if file in new_archives:
+                    manifest["added"] = result
+                else:
+                    manifest["removed"] = result
+                result = manifest
+
+            print("D2P Diff " + file + ": " + str(len(result["added"])) + " added, " +
+                  str(len(result["removed"])) + " removed, " +
+                  str(len(result["modified"])) + " modified")
+            diff[file] = result
+
+    return diff
+
+
+if __name__ == "__main__":
+    try:
+        old = sys.argv[1]
+        new = sys.argv[2]
+    except:
+        old = new = None
+
+    try:
+        processes = int(sys.argv[3])
+    except:
+        processes = None
+
+    if old is None or new is None:
+        print("usage: python d2p_diff.py {old folder|file.d2p} {new folder|file.d2p} [processes]")
+    else:
+        if os.path.isdir(old) and os.path.isdir(new):
+            diff = diff_folders(old, new, processes)
+        else:
+            old_chain = D2PFileSystem(old)
+            new_chain = D2PFileSystem(new)
+            diff = old_chain.diff(new_chain)
+            old_chain.close()
+            new_chain.close()
+
+        json_output = open(path_output + "d2p_diff.json", "w")
+        json.dump(diff, json_output, indent=4)
+        json_output.close()
@@ -1,11 +1,12 @@
-import io, sys, os, tempfile, fnmatch, json
+import sys, os, fnmatch, json
 from collections import OrderedDict
 from pydofus.d2p import D2PReader, D2PBuilder, InvalidD2PFile
-from pydofus.swl import SWLReader, SWLBuilder, InvalidSWLFile
-from pydofus._binarystream import _BinaryStream
+from pydofus.swl import SWLBuilder
 
-# python d2p_pack.py file.d2p (require original file in input folder and unpacked file in output folder)
+# python d2p_pack.py file.d2p swl [incremental] [dedup] (require original file in input folder and unpacked file in output folder)
 # file output: ./output/~generated/file.d2p
+# with incremental, unchanged files are copied from the original file
+# with dedup, identical files are stored once
 
 path_input = "./input/"
 path_output = "./output/"
@@ -20,8 +21,34 @@ try:
 except:
     swl_mode = None
 
+try:
+    incremental = sys.argv[3] == "true"
+except:
+    incremental = False
+
+try:
+    dedup = sys.argv[4] == "true"
+except:
+    dedup = False
+
+def swl_writer(path):
+    """Rebuild the SWL from its SWF and JSON files when the D2P is built"""
+    def writer(stream):
+        json_input = open(path.replace("swf", "json"), "r")
+        swf_input = open(path, "rb")
+
+        swl_data = json.load(json_input)
+        swl_data["SWF"] = swf_input
+
+        swl_builder = SWLBuilder(swl_data, stream)
+        swl_builder.build()
+
+        json_input.close()
+        swf_input.close()
+    return writer
+
 if file is None or swl_mode is None:
-    print("usage: python d2p_pack.py {file.d2p} {swl ture|false}")
+    print("usage: python d2p_pack.py {file.d2p} {swl ture|false} [incremental true|false] [dedup true|false]")
 else:
     print("D2P Packer for " + file)
 
@@ -31,10 +58,10 @@ else:
         os.mkdir(path_output + "~generated")
 
     d2p_input = open(path_input + file, "rb")
-    d2p_template = D2PReader(d2p_input)
+    d2p_template = D2PReader(d2p_input, False)
 
     d2p_ouput = open(path_output + "~generated/" + file, "wb")
-    d2p_builder = D2PBuilder(d2p_template, d2p_ouput)
+    d2p_builder = D2PBuilder(d2p_template, d2p_ouput, incremental, dedup)
 
     list_files = OrderedDict()
 
@@ -47,29 +74,12 @@ else:
             object_ = {}
 
             if "swf" in file and swl_mode == "true":
-                json_input = open(path.replace("swf", "json"), "r")
-                swf_input = open(path, "rb")
-                swl_output = tempfile.TemporaryFile()
-
-                swl_data = json.load(json_input)
-                swl_data["SWF"] = swf_input.read()
-
-                swl_builder = SWLBuilder(swl_data, swl_output)
-                swl_builder.build()
-
-                swl_output.seek(0)
-                object_["binary"] = swl_output.read()
+                object_["writer"] = swl_writer(path)
                 list_files[file.replace("swf", "swl")] = object_
-
-                json_input.close()
-                swf_input.close()
-                swl_output.close()
             elif "json" in file and swl_mode == "true":
                 continue
             else:
-                new_file = open(path, "rb")
-                object_["binary"] = new_file.read()
-                new_file.close()
+                object_["path"] = path
                 list_files[file] = object_
 
             print("pack file " + file)
@@ -77,5 +87,8 @@ else:
     d2p_builder.files = list_files
     d2p_builder.build()
 
+    if dedup:
+        print("dedup saved " + str(d2p_builder.saved_bytes) + " bytes")
+
     d2p_input.close()
     d2p_ouput.close()
@@ -1,53 +1,82 @@
-import io, sys, os, json
+import sys, os, json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pydofus.d2p import D2PReader, InvalidD2PFile
 from pydofus.swl import SWLReader, InvalidSWLFile
 
-# python d2p_pack.py (all files in input folder)
+# python d2p_unpack.py [processes] [threads] (all files in input folder)
 # folder output: ./output/{all files}.d2p
+# archives are extracted by a pool of processes (default: one per CPU),
+# files of an archive by a pool of threads (default: 8)
 
 path_input = "./input/"
 path_output = "./output/"
 
-for file in os.listdir(path_input):
-    if file.endswith(".d2p"):
-        file_name = os.path.basename(file)
-        d2p_file = open(path_input + file, "rb")
-
-        try:
-            os.stat(path_output + file_name)
-        except:
-            os.mkdir(path_output + file_name)
-
-        print("D2P Unpacker for " + file_name)
-
-        try:
-            d2p_reader = D2PReader(d2p_file, False)
-            d2p_reader.load()
-            for name, specs in d2p_reader.files.items():
-                print("extract file " + file_name + "/" + name)
-
-                try:
-                    os.stat(path_output + file_name + "/" + os.path.dirname(name))
-                except:
-                    os.makedirs(path_output + file_name + "/" + os.path.dirname(name))
-
-                if "swl" in name:
-                    swl = io.BytesIO(specs["binary"])
-                    swl_reader = SWLReader(swl)
-
-                    swf_output = open(path_output + file_name + "/" + name.replace("swl", "swf"), "wb")
-                    json_output = open(path_output + file_name + "/" + name.replace("swl", "json"), "w")
-
-                    swf_output.write(swl_reader.SWF)
-                    swl_data = {'version':swl_reader.version, 'frame_rate':swl_reader.frame_rate, 'classes':swl_reader.classes}
-                    json.dump(swl_data, json_output, indent=4)
-
-                    swf_output.close()
-                    json_output.close()
-                else:
-                    file_output = open(path_output + file_name + "/" + name, "wb")
-                    file_output.write(specs["binary"])
-                    file_output.close()
-                pass
-        except InvalidD2PFile:
-            pass
+
+def extract_file(d2p_reader, path, name):
+    if "swl" in name:
+        swl_reader = SWLReader(d2p_reader.read(name))
+
+        swf_output = open(path + name.replace("swl", "swf"), "wb")
+        json_output = open(path + name.replace("swl", "json"), "w")
+
+        swf_output.write(swl_reader.SWF)
+        swl_data = {'version':swl_reader.version, 'frame_rate':swl_reader.frame_rate, 'classes':swl_reader.classes}
+        json.dump(swl_data, json_output, indent=4)
+
+        swf_output.close()
+        json_output.close()
+    else:
+        file_output = open(path + name, "wb")
+        d2p_reader.extract(name, file_output)
+        file_output.close()
+
+
+def extract_archive(file_name, threads):
+    d2p_file = open(path_input + file_name, "rb")
+    path = path_output + file_name + "/"
+
+    try:
+        d2p_reader = D2PReader(d2p_file, False, True)
+        names = list(d2p_reader.files)
+
+        for directory in set(os.path.dirname(name) for name in names):
+            os.makedirs(path + directory, exist_ok=True)
+
+        with ThreadPoolExecutor(threads) as pool:
+            for future in [pool.submit(extract_file, d2p_reader, path, name)
+                           for name in names]:
+                future.result()
+
+        d2p_reader.close()
+        return len(names)
+    except InvalidD2PFile:
+        return 0
+    finally:
+        d2p_file.close()
+
+
+if __name__ == "__main__":
+    try:
+        processes = int(sys.argv[1])
+    except:
+        processes = None
+
+    try:
+        threads = int(sys.argv[2])
+    except:
+        threads = 8
+
+    archives = [file for file in os.listdir(path_input) if file.endswith(".d2p")]
+    extracted = 0
+
+    with ProcessPoolExecutor(processes) as pool:
+        futures = dict((pool.submit(extract_archive, file_name, threads), file_name)
+                       for file_name in archives)
+
+        for done, future in enumerate(as_completed(futures), 1):
+            count = future.result()
+            extracted += count
+            print("D2P Unpacker [" + str(done) + "/" + str(len(archives)) + "] " +
+                  futures[future] + ": " + str(count) + " files")
+
+    print("extracted " + str(extracted) + " files from " + str(len(archives)) + " archives")
@@ -1,8 +1,70 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import mmap
+import os
+import sys
+from array import array
 from struct import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _compile_structs(prefix):
+    return dict((fmt, Struct(prefix + fmt)) for fmt in "bB?hHiIqQfd")
+
+_BIG_ENDIAN_STRUCTS = _compile_structs(">")
+_LITTLE_ENDIAN_STRUCTS = _compile_structs("<")
+
+_RECORD_STRUCTS = dict()
+
+_BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+def _record_struct(fmt, big_endian):
+    if big_endian:
+        fmt = ">" + fmt
+    else:
+        fmt = "<" + fmt
+    if fmt not in _RECORD_STRUCTS:
+        _RECORD_STRUCTS[fmt] = Struct(fmt)
+    return _RECORD_STRUCTS[fmt]
+
+
+def _replace_file(path, data):
+    """Write data to path through a temporary file renamed over it, so
+    concurrent processes never read a partial file. Errors are ignored, the
+    file being a cache."""
+    temporary_path = path + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temporary_path, "wb") as stream:
+            stream.write(data)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+def _decode_array(fmt, data, count, big_endian):
+    """Decode count items of the struct format fmt from data in one call,
+    as a NumPy array if NumPy is installed and an array.array otherwise"""
+    size = count * calcsize(fmt)
+    if len(data) != size:
+        raise error("unpack requires a buffer of " + str(size) + " bytes")
+    if numpy is not None:
+        if big_endian:
+            return numpy.frombuffer(data, ">" + fmt, count)
+        else:
+            return numpy.frombuffer(data, "<" + fmt, count)
+    values = array(fmt)
+    values.frombytes(data)
+    if big_endian != (sys.byteorder == "big"):
+        values.byteswap()
+    return values
+
+
 class _BinaryStream:
     """Allow some binary operations on a stream opened in binary mode"""
     def __init__(self, base_stream, big_endian=False):
@@ -75,10 +137,14 @@ class _BinaryStream:
 
     def _pack(self, fmt, data):
         if self._big_endian:
-            fmt = ">" + fmt
+            structs = _BIG_ENDIAN_STRUCTS
+            prefix = ">"
         else:
-            fmt = "<" + fmt
-        return self.write_bytes(pack(fmt, data))
+            structs = _LITTLE_ENDIAN_STRUCTS
+            prefix = "<"
+        if fmt in structs:
+            return self.write_bytes(structs[fmt].pack(data))
+        return self.write_bytes(pack(prefix + fmt, data))
 
     # Read functions
 
@@ -142,7 +208,270 @@ class _BinaryStream:
     def _unpack(self, fmt, length=1):
         bytes = self.read_bytes(length)
         if self._big_endian:
-            fmt = ">" + fmt
+            structs = _BIG_ENDIAN_STRUCTS
+            prefix = ">"
         else:
-            fmt = "<" + fmt
-        return unpack(fmt, bytes)[0]
+            structs = _LITTLE_ENDIAN_STRUCTS
+            prefix = "<"
+        if fmt in structs:
+            return structs[fmt].unpack(bytes)[0]
+        return unpack(prefix + fmt, bytes)[0]
+
+    # Bulk read functions
+
+    def read_int16_array(self, count):
+        return self._unpack_array('h', count)
+
+    def read_uint16_array(self, count):
+        return self._unpack_array('H', count)
+
+    def read_int32_array(self, count):
+        return self._unpack_array('i', count)
+
+    def read_uint32_array(self, count):
+        return self._unpack_array('I', count)
+
+    def read_double_array(self, count):
+        return self._unpack_array('d', count)
+
+    def read_record_array(self, fmt, count):
+        struct = _record_struct(fmt, self._big_endian)
+        bytes = self.read_bytes(struct.size * count)
+        if len(bytes) != struct.size * count:
+            raise error("unpack requires a buffer of " +
+                        str(struct.size * count) + " bytes")
+        return list(struct.iter_unpack(bytes))
+
+    def _unpack_array(self, fmt, count):
+        bytes = self.read_bytes(calcsize(fmt) * count)
+        return _decode_array(fmt, bytes, count, self._big_endian)
+
+
+class _BinaryBuffer:
+    """Allow the read operations of _BinaryStream on a bytes-like object,
+    read_bytes returns memoryview slices over it instead of copies"""
+    def __init__(self, buffer, big_endian=False):
+        self._buffer = memoryview(buffer)
+        self._length = len(self._buffer)
+        self._cursor = 0
+        self._big_endian = big_endian
+
+        if big_endian:
+            structs = _BIG_ENDIAN_STRUCTS
+        else:
+            structs = _LITTLE_ENDIAN_STRUCTS
+
+        self._char = structs["b"]
+        self._uchar = structs["B"]
+        self._bool = structs["?"]
+        self._int16 = structs["h"]
+        self._uint16 = structs["H"]
+        self._int32 = structs["i"]
+        self._uint32 = structs["I"]
+        self._int64 = structs["q"]
+        self._uint64 = structs["Q"]
+        self._float = structs["f"]
+        self._double = structs["d"]
+
+    # Comment functions
+
+    def position(self, value=None):
+        if value is None:
+            return self._cursor
+        else:
+            self._cursor = value
+
+    def bytes_available(self):
+        return self._length - self._cursor
+
+    # Read functions
+
+    def read_byte(self):
+        return self.read_bytes(1)
+
+    def read_bytes(self, length=None):
+        start = self._cursor
+        if length is None:
+            end = self._length
+        else:
+            end = min(start + length, self._length)
+        self._cursor = end
+        return self._buffer[start:end]
+
+    def read_char(self):
+        return self._unpack(self._char)
+
+    def read_uchar(self):
+        return self._unpack(self._uchar)
+
+    def read_bool(self):
+        return self._unpack(self._bool)
+
+    def read_int16(self):
+        return self._unpack(self._int16)
+
+    def read_uint16(self):
+        return self._unpack(self._uint16)
+
+    def read_int32(self):
+        return self._unpack(self._int32)
+
+    def read_uint32(self):
+        return self._unpack(self._uint32)
+
+    def read_int64(self):
+        return self._unpack(self._int64)
+
+    def read_uint64(self):
+        return self._unpack(self._uint64)
+
+    def read_float(self):
+        return self._unpack(self._float)
+
+    def read_double(self):
+        return self._unpack(self._double)
+
+    def read_string(self):
+        length = self.read_uint16()
+        return self.read_string_bytes(length)
+
+    def read_string_bytes(self, length):
+        start = self._cursor
+        end = start + length
+        if end > self._length:
+            raise error("unpack requires a buffer of " + str(length) +
+                        " bytes")
+        self._cursor = end
+        return self._buffer[start:end].tobytes()
+
+    def _unpack(self, struct):
+        value = struct.unpack_from(self._buffer, self._cursor)[0]
+        self._cursor += struct.size
+        return value
+
+    # Bulk read functions
+
+    def read_int16_array(self, count):
+        return self._unpack_array('h', count)
+
+    def read_uint16_array(self, count):
+        return self._unpack_array('H', count)
+
+    def read_int32_array(self, count):
+        return self._unpack_array('i', count)
+
+    def read_uint32_array(self, count):
+        return self._unpack_array('I', count)
+
+    def read_double_array(self, count):
+        return self._unpack_array('d', count)
+
+    def read_record_array(self, fmt, count):
+        struct = _record_struct(fmt, self._big_endian)
+        start = self._cursor
+        end = start + struct.size * count
+        if end > self._length:
+            raise error("unpack requires a buffer of " +
+                        str(struct.size * count) + " bytes")
+        self._cursor = end
+        return list(struct.iter_unpack(self._buffer[start:end]))
+
+    def _unpack_array(self, fmt, count):
+        start = self._cursor
+        end = min(start + calcsize(fmt) * count, self._length)
+        values = _decode_array(fmt, self._buffer[start:end], count,
+                               self._big_endian)
+        self._cursor = end
+        return values
+
+
+class _BinaryBuilder:
+    """Allow the write operations of _BinaryStream on a growing bytearray,
+    to be flushed to a stream in a single write"""
+    def __init__(self, big_endian=False):
+        self._buffer = bytearray()
+        self._big_endian = big_endian
+
+        if big_endian:
+            self._structs = _BIG_ENDIAN_STRUCTS
+        else:
+            self._structs = _LITTLE_ENDIAN_STRUCTS
+
+        self._char = self._structs["b"]
+        self._uchar = self._structs["B"]
+        self._bool = self._structs["?"]
+        self._int16 = self._structs["h"]
+        self._uint16 = self._structs["H"]
+        self._int32 = self._structs["i"]
+        self._uint32 = self._structs["I"]
+        self._int64 = self._structs["q"]
+        self._uint64 = self._structs["Q"]
+        self._float = self._structs["f"]
+        self._double = self._structs["d"]
+
+    # Comment functions
+
+    def position(self):
+        return len(self._buffer)
+
+    def getvalue(self):
+        return self._buffer
+
+    def flush(self, stream):
+        stream.write(self._buffer)
+
+    # Backpatch functions
+
+    def reserve(self, fmt):
+        """Write a zeroed placeholder for fmt and return a handle to patch
+        it later"""
+        struct = self._structs[fmt]
+        position = len(self._buffer)
+        self._buffer += bytes(struct.size)
+        return (struct, position)
+
+    def patch(self, handle, value):
+        struct, position = handle
+        struct.pack_into(self._buffer, position, value)
+
+    # Write functions
+
+    def write_bytes(self, value):
+        self._buffer += value
+
+    def write_char(self, value):
+        self._buffer += self._char.pack(value)
+
+    def write_uchar(self, value):
+        self._buffer += self._uchar.pack(value)
+
+    def write_bool(self, value):
+        self._buffer += self._bool.pack(value)
+
+    def write_int16(self, value):
+        self._buffer += self._int16.pack(value)
+
+    def write_uint16(self, value):
+        self._buffer += self._uint16.pack(value)
+
+    def write_int32(self, value):
+        self._buffer += self._int32.pack(value)
+
+    def write_uint32(self, value):
+        self._buffer += self._uint32.pack(value)
+
+    def write_int64(self, value):
+        self._buffer += self._int64.pack(value)
+
+    def write_uint64(self, value):
+        self._buffer += self._uint64.pack(value)
+
+    def write_float(self, value):
+        self._buffer += self._float.pack(value)
+
+    def write_double(self, value):
+        self._buffer += self._double.pack(value)
+
+    def write_string(self, value):
+        self._buffer += self._uint16.pack(len(value))
+        self._buffer += value
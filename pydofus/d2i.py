@@ -1,8 +1,8 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-import zlib, tempfile, io, unicodedata
-from ._binarystream import _BinaryStream
+import unicodedata
+from ._binarystream import _BinaryBuffer, _BinaryBuilder
 from collections import OrderedDict
 
 class InvalidD2IFile(Exception):
@@ -14,9 +14,11 @@ class D2I:
     def __init__(self, stream):
         self._stream = stream
         self._obj = OrderedDict()
+        self._index = None
 
     def read(self):
-        raw = _BinaryStream(self._stream, True)
+        self._stream.seek(0)
+        raw = _BinaryBuffer(self._stream.read(), True)
 
         indexs = OrderedDict()
         unDiacriticalIndex = OrderedDict()
@@ -26,7 +28,7 @@ class D2I:
         self._obj["idText"] = OrderedDict()
 
         indexesPointer = raw.read_int32()
-        self._stream.seek(indexesPointer)
+        raw.position(indexesPointer)
 
         i = 0
         indexesLength = raw.read_int32()
@@ -45,49 +47,79 @@ class D2I:
 
         indexesLength = raw.read_int32()
         while indexesLength > 0:
-            position = self._stream.tell()
+            position = raw.position()
             textKey = raw.read_string().decode("utf-8")
             pointer = raw.read_int32()
             self._obj["nameText"][textKey] = indexs[pointer]
-            indexesLength = (indexesLength - (self._stream.tell() - position))
+            indexesLength = (indexesLength - (raw.position() - position))
 
-        i = 0
         indexesLength = raw.read_int32()
-        while indexesLength > 0:
-            position = self._stream.tell()
-            i += 1
-            self._obj["idText"][raw.read_int32()] = i
-            indexesLength = (indexesLength - (self._stream.tell() - position))
+        ids = raw.read_int32_array(indexesLength // 4).tolist()
+        self._obj["idText"] = OrderedDict(zip(ids, range(1, len(ids) + 1)))
 
         for pointer, key in indexs.items():
-            self._stream.seek(pointer)
+            raw.position(pointer)
             self._obj["texts"][key] = raw.read_string().decode("utf-8")
 
         return self._obj
 
+    def read_index(self):
+        """Read only the index of the texts: their pointer by key"""
+        if self._index is None:
+            self._stream.seek(0)
+            header = _BinaryBuffer(self._stream.read(4), True)
+            self._stream.seek(header.read_int32())
+            raw = _BinaryBuffer(self._stream.read(4), True)
+            raw = _BinaryBuffer(self._stream.read(raw.read_int32()), True)
+
+            index = OrderedDict()
+            while raw.bytes_available():
+                key = raw.read_int32()
+                diacriticalText = raw.read_bool()
+                index[key] = raw.read_int32()
+                if diacriticalText:
+                    raw.read_int32()
+            self._index = index
+        return self._index
+
+    def read_texts(self, keys):
+        """Read only the texts of keys, in the order of their pointers so
+        the file is read forward, and return them by key. Unknown keys
+        are skipped."""
+        index = self.read_index()
+        pointers = sorted((index[key], key) for key in set(keys)
+                          if key in index)
+
+        texts = OrderedDict()
+        for pointer, key in pointers:
+            self._stream.seek(pointer)
+            length = _BinaryBuffer(self._stream.read(2), True).read_uint16()
+            texts[key] = self._stream.read(length).decode("utf-8")
+        return texts
+
     def write(self, obj):
-        raw = _BinaryStream(self._stream, True)
+        raw = _BinaryBuilder(True)
 
         indexs = OrderedDict()
 
-        raw.write_int32(0) # indexes offset
+        indexesPointer = raw.reserve("i") # indexes offset
 
         i = 0
         for key in obj["texts"]:
-            data = {"pointer": self._stream.tell(), "diacriticalText": False, }
+            data = {"pointer": raw.position(), "diacriticalText": False, }
 
             raw.write_string(obj["texts"][key].encode())
             if self.needCritical(obj["texts"][key]):
                 data["diacriticalText"] = True
-                data["unDiacriticalIndex"] = self._stream.tell()
+                data["unDiacriticalIndex"] = raw.position()
                 raw.write_string(self.unicode(obj["texts"][key].lower()))
 
             i += 1
             indexs[key] = data
 
-        indexesSizePosition = self._stream.tell()
-        raw.write_int32(0) # indexes size
-        indexesPosition = self._stream.tell()
+        raw.patch(indexesPointer, raw.position())
+        indexesSize = raw.reserve("i") # indexes size
+        indexesPosition = raw.position()
 
         for i, data in indexs.items():
             raw.write_int32(data["pointer"])
@@ -96,41 +128,26 @@ class D2I:
             if data["diacriticalText"]:
                 raw.write_int32(data["unDiacriticalIndex"])
 
-        indexesLength = (self._stream.tell() - indexesPosition)
+        raw.patch(indexesSize, raw.position() - indexesPosition)
 
-        nameTextSizePosition = self._stream.tell()
-        raw.write_int32(0) # name text size
-        nameTextPosition = self._stream.tell()
+        nameTextSize = raw.reserve("i") # name text size
+        nameTextPosition = raw.position()
 
         for name, key in obj["nameText"].items():
             raw.write_string(name.encode())
             raw.write_int32(indexs[str(key)]["pointer"])
 
-        nameTextLength = (self._stream.tell() - nameTextPosition)
+        raw.patch(nameTextSize, raw.position() - nameTextPosition)
 
-        idTextSizePosition = self._stream.tell()
-        raw.write_int32(0) # id text size
-        idTextPosition = self._stream.tell()
+        idTextSize = raw.reserve("i") # id text size
+        idTextPosition = raw.position()
 
         for id in obj["idText"]:
             raw.write_int32(int(id))
 
-        idTextLength = (self._stream.tell() - idTextPosition)
-        EOF = self._stream.tell()
-
-        self._stream.seek(0)
-        raw.write_int32(indexesSizePosition)
-
-        self._stream.seek(indexesSizePosition)
-        raw.write_int32(indexesLength)
-
-        self._stream.seek(nameTextSizePosition)
-        raw.write_int32(nameTextLength)
-
-        self._stream.seek(idTextSizePosition)
-        raw.write_int32(idTextLength)
+        raw.patch(idTextSize, raw.position() - idTextPosition)
 
-        self._stream.seek(EOF)
+        raw.flush(self._stream)
 
     def needCritical(self, str):
         return all(ord(char) < 128 for char in str) == False
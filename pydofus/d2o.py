@@ -1,9 +1,20 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from ._binarystream import _BinaryStream
+import json, keyword, mmap, os, sys, threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from array import array
+from struct import Struct, calcsize, pack
+from ._binarystream import _BinaryBuffer, _BinaryBuilder, \
+    _BIG_ENDIAN_STRUCTS, _decode_array, _replace_file
 from collections import OrderedDict
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Exceptions
 
 
@@ -17,46 +28,53 @@ class InvalidD2OFile(Exception):
 
 class D2OReader:
     """Read D2O files"""
-    def __init__(self, stream):
-        """Init the class with the informations about files in the D2P"""
+    def __init__(self, stream, registry=None, compact=False):
+        """Init the class with the informations about files in the D2P.
+        With a D2OSchemaRegistry, the decoders are shared with the other
+        readers of the registry with the same classes. In compact mode, the
+        objects are D2ORecords and their strings are interned"""
         # Attributes
         self._stream = stream
+        self._registry = registry
+        self._compact = compact
 
         self._stream_start_index = 7
         self._classes = OrderedDict()
         self._counter = 0
+        self._index = None
+        self._game_data_processor = None
 
         # Load the D2O
-        D2O_file_binary = _BinaryStream(self._stream, True)
+        self._stream.seek(0)
+        self._data = self._stream.read()
+        D2O_file_binary = _BinaryBuffer(self._data, True)
         self._D2O_file_binary = D2O_file_binary
 
         string_header = D2O_file_binary.read_bytes(3)
         base_offset = 0
         if string_header != b'D2O':
-            self._stream.seek(0)
+            D2O_file_binary.position(0)
             string_header = D2O_file_binary.read_string()
-            if string_header != "AKSF":
+            if string_header != b"AKSF":
                 raise InvalidD2OFile("Malformated game data file.")
-            D2O_file_binary.read_short()
-            base_offset = D2O_file_binary.read_int32()
-            self._stream.seek(base_offset, 1)
-            self._stream_start_index = self._stream.position + 7
+            D2O_file_binary.read_int16()
+            length = D2O_file_binary.read_int32()
+            D2O_file_binary.position(D2O_file_binary.position() + length)
+            base_offset = D2O_file_binary.position()
+            self._stream_start_index = base_offset + 7
             string_header = D2O_file_binary.read_bytes(3)
             if string_header != b'D2O':
                 raise InvalidD2OFile("Malformated game data file.")
 
         offset = D2O_file_binary.read_int32()
-        self._stream.seek(base_offset + offset)
+        self._index_position = base_offset + offset
+        D2O_file_binary.position(base_offset + offset)
         index_number = D2O_file_binary.read_int32()
-        index = 0
-        index_dict = OrderedDict()
-
-        while index < index_number:
-            index_id = D2O_file_binary.read_int32()
-            offset = D2O_file_binary.read_int32()
-            index_dict[index_id] = base_offset + offset
-            self._counter += 1
-            index = index + 8
+        indexes = D2O_file_binary.read_int32_array(index_number // 4).tolist()
+        self._index = OrderedDict(zip(indexes[0::2],
+                                      [base_offset + offset
+                                       for offset in indexes[1::2]]))
+        self._counter = index_number // 8
 
         class_number = D2O_file_binary.read_int32()
         class_index = 0
@@ -66,31 +84,224 @@ class D2OReader:
             self._read_class_definition(class_id, D2O_file_binary)
             class_index += 1
 
+        # Compile the decoders of all the classes once
+        if registry is not None:
+            self._decoders = registry._get_decoders(
+                [class_def.get_spec() for class_def in self._classes.values()],
+                compact, self._compile_decoders)
+        else:
+            self._decoders = self._compile_decoders()
+
         if D2O_file_binary.bytes_available():
             self._game_data_processor = _GameDataProcess(D2O_file_binary)
 
     def get_objects(self):
         if not self._counter:
             return None
+        return list(self.iter_objects())
+
+    def iter_objects(self):
+        """Decode the objects one at a time, in the order of the file"""
+        return self._iter_decoded(self._decoders)
+
+    def _iter_decoded(self, decoders):
+        """Decode the objects in the order of the file with decoders, a dict
+        of decoder functions by class id"""
         counter = self._counter
-        classes = self._classes
-        D2O_file_binary = self._D2O_file_binary
-        D2O_file_binary.position(self._stream_start_index)
-        objects = list()
+        buffer = self._D2O_file_binary._buffer
+        position = self._stream_start_index
         i = 0
         while i < counter:
-            objects.append(
-                classes[D2O_file_binary.read_int32()].read(D2O_file_binary))
+            class_id = _INT32.unpack_from(buffer, position)[0]
+            obj, position = decoders[class_id](buffer, position + 4)
+            yield obj
             i += 1
-        return objects
+
+    def get_objects_parallel(self, processes=None, chunk_size=4096):
+        """Decode the objects in worker processes and return them in the
+        order of the file, see iter_objects_parallel"""
+        return list(self.iter_objects_parallel(processes, chunk_size))
+
+    def iter_objects_parallel(self, processes=None, chunk_size=4096):
+        """Decode the objects in worker processes and yield them in the
+        order of the file, like iter_objects. The index is split in chunks of chunk_size objects, decoded
+        against a mmap of the file by workers which compile the class
+        definitions once, and yielded chunk by chunk as they come back.
+        Without a file path, the objects are decoded in this process. The
+        objects are OrderedDicts, even in compact mode."""
+        positions = sorted(self._index.values())
+        path = getattr(self._stream, "name", None)
+        if not isinstance(path, str):
+            for position in positions:
+                yield self._decode_at(position)
+            return
+
+        schema = OrderedDict((class_id, class_def.get_schema())
+                             for class_id, class_def in self._classes.items())
+        chunks = [positions[i:i + chunk_size]
+                  for i in range(0, len(positions), chunk_size)]
+        with ProcessPoolExecutor(processes, initializer=_parallel_init,
+                                 initargs=(os.path.abspath(path),
+                                           schema)) as pool:
+            for chunk in pool.map(_parallel_decode, chunks):
+                yield from chunk
+
+    def get_object(self, object_id):
+        """Decode only the object with the given id, found by the index"""
+        return self._decode_at(self._index[object_id])
+
+    def get_many(self, object_ids):
+        return [self._decode_at(self._index[object_id])
+                for object_id in object_ids]
+
+    def ids(self, file_order=False):
+        """Return the ids of the objects in the order of the index or, with
+        file_order, in the order of the file, the one of iter_objects"""
+        if file_order:
+            return sorted(self._index, key=self._index.__getitem__)
+        return list(self._index)
+
+    def get_object_class_id(self, object_id):
+        """Return the class id of the object with the given id"""
+        return _INT32.unpack_from(self._D2O_file_binary._buffer,
+                                  self._index[object_id])[0]
+
+    def __getitem__(self, object_id):
+        return self.get_object(object_id)
+
+    def __contains__(self, object_id):
+        return object_id in self._index
+
+    def __len__(self):
+        return len(self._index)
 
     def get_class_definition(self, object_id):
         return self._classes[object_id]
 
+    def get_classes(self):
+        """Return the class definitions as JSON-friendly dicts, as taken by
+        D2OBuilder"""
+        return [_get_class_json(class_def.get_spec())
+                for class_def in self._classes.values()]
+
+    def diff(self, other):
+        """Compare with another D2O, see _diff_objects"""
+        return _diff_objects(self, other)
+
+    def _get_ranges(self):
+        """Return the (start, end) of the bytes of the objects by id, an
+        object ending where the next one starts or at the index table"""
+        positions = sorted(self._index.values())
+        ends = dict(zip(positions, positions[1:] + [self._index_position]))
+        return dict((object_id, (position, ends[position]))
+                    for object_id, position in self._index.items())
+
+    def query(self, field, value):
+        """Return the objects whose field is equal to value, or for which
+        value returns True when it is a function, found by the search
+        tables without decoding the other objects"""
+        return self.get_many(self.query_ids(field, value))
+
+    def query_range(self, field, low=None, high=None):
+        """Return the objects whose field is between low and high included,
+        None meaning no bound"""
+        return self.get_many(self.query_range_ids(field, low, high))
+
+    def query_all(self, *conditions):
+        """Return the objects matching all the (field, value) conditions"""
+        return self.get_many(self.query_all_ids(*conditions))
+
+    def query_any(self, *conditions):
+        """Return the objects matching any of the (field, value) conditions"""
+        return self.get_many(self.query_any_ids(*conditions))
+
+    def query_ids(self, field, value):
+        if self._game_data_processor is None:
+            raise KeyError(field)
+        return self._game_data_processor.query(field, value)
+
+    def query_range_ids(self, field, low=None, high=None):
+        def match(value):
+            return (low is None or value >= low) and \
+                (high is None or value <= high)
+        return self.query_ids(field, match)
+
+    def query_all_ids(self, *conditions):
+        ids = None
+        for field, value in conditions:
+            matched = set(self.query_ids(field, value))
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                return list()
+        return sorted(ids) if ids else list()
+
+    def query_any_ids(self, *conditions):
+        ids = set()
+        for field, value in conditions:
+            ids.update(self.query_ids(field, value))
+        return sorted(ids)
+
+    def _decode_at(self, position):
+        buffer = self._D2O_file_binary._buffer
+        class_id = _INT32.unpack_from(buffer, position)[0]
+        return self._decoders[class_id](buffer, position + 4)[0]
+
+    def get_table(self, class_id):
+        """Return the D2OTable of the objects of a class"""
+        positions = self._get_class_positions().get(class_id, OrderedDict())
+        return self._read_table(class_id, positions)
+
+    def get_tables(self):
+        """Return the D2OTables of the classes with objects, by class id"""
+        return OrderedDict((class_id, self._read_table(class_id, positions))
+                           for class_id, positions
+                           in self._get_class_positions().items())
+
+    def _get_class_positions(self):
+        """Return the ids and positions of the objects by class id"""
+        buffer = self._D2O_file_binary._buffer
+        classes = OrderedDict()
+        for object_id, position in self._index.items():
+            class_id = _INT32.unpack_from(buffer, position)[0]
+            classes.setdefault(class_id, OrderedDict())[object_id] = position
+        return classes
+
+    def _read_table(self, class_id, positions):
+        if numpy is None:
+            raise ImportError("NumPy is required by the columnar export.")
+        class_def = self._classes[class_id]
+        schema = class_def.get_schema()
+        decoder = _compile_class(schema, self._decoders, tuple)
+        buffer = self._D2O_file_binary._buffer
+        rows = [decoder(buffer, position + 4)[0]
+                for position in positions.values()]
+        values = list(zip(*rows)) or [()] * len(schema)
+        columns = OrderedDict(
+            (name, _make_column(type_id, inner_type_ids, column))
+            for (name, type_id, inner_type_ids), column in zip(schema, values))
+        return D2OTable(class_def._class,
+                        numpy.array(list(positions), "i"), columns)
+
+    def _get_queryable_fields(self):
+        if self._game_data_processor is None:
+            return list()
+        return list(self._game_data_processor._search_field_index)
+
+    def _compile_decoders(self):
+        decoders = dict()
+        for class_id, class_def in self._classes.items():
+            make = None
+            if self._compact:
+                make = class_def.get_record_type()
+            decoders[class_id] = class_def.compile(decoders, make,
+                                                   self._compact)
+        return decoders
+
     def _read_class_definition(self, class_id, D2O_file_binary):
         class_name = D2O_file_binary.read_string()
         class_pkg = D2O_file_binary.read_string()
-        class_def = _GameDataClassDefinition(class_pkg, class_name, self)
+        class_def = _GameDataClassDefinition(class_pkg, class_name, self,
+                                             class_id)
         field_number = D2O_file_binary.read_int32()
         field_index = 0
 
@@ -101,11 +312,210 @@ class D2OReader:
 
         self._classes[class_id] = class_def
 
+    # Accessors
+
+    queryable_fields = property(_get_queryable_fields)
+
+
+class D2OBuilder:
+    """Build D2O files"""
+    def __init__(self, classes, target, queryable_fields=None):
+        """Init the class with the class definitions, from a D2OReader or
+        as returned by D2OReader.get_classes, and the target stream. The
+        search tables of queryable_fields are generated, by default the
+        ones of the D2OReader."""
+        self._stream = target
+
+        if isinstance(classes, D2OReader):
+            if queryable_fields is None:
+                queryable_fields = classes.queryable_fields
+            classes = classes.get_classes()
+
+        self._classes = OrderedDict()
+        for class_json in classes:
+            class_id, class_pkg, class_name, fields = \
+                _get_class_spec(class_json)
+            self._classes[class_id] = (class_pkg, class_name, fields)
+        self._queryable_fields = list(queryable_fields or ())
+        self._objects = list()
+
+        # Classes by full name and by field names, to find the class of the
+        # objects; the first class wins when several have the same fields
+        self._class_ids = dict()
+        self._field_classes = dict()
+        self._field_names = dict()
+        for class_id, (class_pkg, class_name, fields) in \
+                self._classes.items():
+            names = tuple(field[0].decode('utf-8') for field in fields)
+            self._class_ids[class_pkg.decode('utf-8') + '.' +
+                            class_name.decode('utf-8')] = class_id
+            self._field_classes.setdefault(names, class_id)
+            self._field_names[class_id] = names
+
+    def add_object(self, obj, object_id=None, class_id=None):
+        """Add an object, OrderedDict or D2ORecord. By default, its id is
+        its id field and its class the one with the same fields."""
+        if object_id is None:
+            object_id = obj["id"]
+        self._objects.append((object_id, class_id, obj))
+
+    def build(self):
+        """Create the D2O represented by the class in the given stream."""
+        encoders = dict()
+        for class_id, (class_pkg, class_name, fields) in \
+                self._classes.items():
+            encoders[class_id] = _compile_encoder(
+                tuple((name.decode('utf-8'), type_id, inner_type_ids)
+                      for name, type_id, inner_type_names, inner_type_ids
+                      in fields), encoders, self._get_class_id)
+
+        # Encode the objects in one pass, collecting the values of the
+        # queryable fields
+        data = bytearray(b"D2O\0\0\0\0")
+        indexes = list()
+        values = dict((field, OrderedDict())
+                      for field in self._queryable_fields)
+        for object_id, class_id, obj in self._objects:
+            if class_id is None:
+                class_id = self._get_class_id(obj)
+            indexes.append(object_id)
+            indexes.append(len(data))
+            data += _INT32.pack(class_id)
+            encoders[class_id](data, obj)
+            for field, field_values in values.items():
+                if field in obj:
+                    field_values.setdefault(obj[field], list()).append(
+                        object_id)
+        _INT32.pack_into(data, 3, len(data))
+        self._stream.write(data)
+
+        raw = _BinaryBuilder(True)
+        indexes = array("i", indexes)
+        if sys.byteorder == "little":
+            indexes.byteswap()
+        raw.write_int32(len(indexes) * 4)
+        raw.write_bytes(indexes.tobytes())
+
+        raw.write_int32(len(self._classes))
+        for class_id, (class_pkg, class_name, fields) in \
+                self._classes.items():
+            raw.write_int32(class_id)
+            raw.write_string(class_name)
+            raw.write_string(class_pkg)
+            raw.write_int32(len(fields))
+            for name, type_id, inner_type_names, inner_type_ids in fields:
+                raw.write_string(name)
+                raw.write_int32(type_id)
+                for inner_name, inner_id in zip(inner_type_names,
+                                                inner_type_ids):
+                    raw.write_string(inner_name)
+                    raw.write_int32(inner_id)
+
+        if values:
+            self._write_search_tables(raw, values)
+        raw.flush(self._stream)
+
+    def _write_search_tables(self, raw, values):
+        """Write the fields list then, by field, the sorted values each
+        followed by the ids of the objects with the value"""
+        field_list = _BinaryBuilder(True)
+        tables = _BinaryBuilder(True)
+        for field, field_values in values.items():
+            field_type = self._get_field_type(field)
+            write_value = getattr(tables, _SEARCH_WRITE_METHODS[field_type])
+            field_list.write_string(field.encode())
+            field_list.write_int32(tables.position())
+            field_list.write_int32(field_type)
+            field_list.write_int32(len(field_values))
+            for value in sorted(field_values):
+                ids = field_values[value]
+                write_value(value.encode() if field_type == -3 else value)
+                tables.write_int32(len(ids) * 4)
+                for object_id in ids:
+                    tables.write_int32(object_id)
+
+        raw.write_int32(field_list.position())
+        raw.write_bytes(field_list.getvalue())
+        raw.write_int32(tables.position())
+        raw.write_bytes(tables.getvalue())
+
+    def _get_field_type(self, field):
+        for class_pkg, class_name, fields in self._classes.values():
+            for name, type_id, inner_type_names, inner_type_ids in fields:
+                if name.decode('utf-8') == field and \
+                        type_id in _SEARCH_WRITE_METHODS:
+                    return type_id
+        raise RuntimeError("No field \'" + field + "\' to search by.")
+
+    def _get_class_id(self, obj, declared_id=None):
+        """Return the class of an object: the one of a D2ORecord, else the
+        declared class if it has the fields of the object, else the first
+        class with these fields"""
+        if isinstance(obj, D2ORecord):
+            return self._class_ids[obj._class]
+        names = tuple(obj)
+        if self._field_names.get(declared_id) == names:
+            return declared_id
+        if names not in self._field_classes:
+            raise RuntimeError("No class with the fields " + str(names) + ".")
+        return self._field_classes[names]
+
+    # Accessors
+
+    def _get_queryable_fields(self):
+        return self._queryable_fields
+
+    def _set_queryable_fields(self, queryable_fields):
+        self._queryable_fields = list(queryable_fields)
+
+    # Properties
+
+    queryable_fields = property(_get_queryable_fields, _set_queryable_fields)
+
+
+def _get_class_json(spec):
+    class_id, class_pkg, class_name, fields = spec
+    return OrderedDict([("id", class_id),
+                        ("package", class_pkg.decode('utf-8')),
+                        ("name", class_name.decode('utf-8')),
+                        ("fields", [_get_field_json(field)
+                                    for field in fields])])
+
+
+def _get_class_spec(class_json):
+    return (class_json["id"], class_json["package"].encode(),
+            class_json["name"].encode(),
+            tuple(_get_field_spec(field) for field in class_json["fields"]))
+
+
+def _get_field_json(field):
+    name, type_id, inner_type_names, inner_type_ids = field
+    field_json = OrderedDict([("name", name.decode('utf-8')),
+                              ("type", type_id)])
+    if type_id == -99:
+        field_json["vectorTypes"] = [
+            OrderedDict([("name", inner_name.decode('utf-8')),
+                         ("type", inner_id)])
+            for inner_name, inner_id in zip(inner_type_names,
+                                            inner_type_ids)]
+    return field_json
+
+
+def _get_field_spec(field_json):
+    vector_types = field_json.get("vectorTypes", ())
+    return (field_json["name"].encode(), field_json["type"],
+            tuple(vector_type["name"].encode()
+                  for vector_type in vector_types),
+            tuple(vector_type["type"] for vector_type in vector_types))
+
 
 class _GameDataClassDefinition:
-    def __init__(self, class_pkg, class_name, d2o_reader):
+    def __init__(self, class_pkg, class_name, d2o_reader, class_id=None):
         self._class = class_pkg.decode('utf-8') + '.' + \
             class_name.decode('utf-8')
+        self._class_pkg = class_pkg
+        self._class_name = class_name
+        self._class_id = class_id
         self._fields = list()
         self._d2o_reader = d2o_reader
 
@@ -113,11 +523,66 @@ class _GameDataClassDefinition:
         return self._fields
 
     def read(self, D2O_file_binary):
+        if isinstance(D2O_file_binary, _BinaryBuffer):
+            decoder = self._d2o_reader._decoders[self._class_id]
+            obj, D2O_file_binary._cursor = decoder(D2O_file_binary._buffer,
+                                                   D2O_file_binary._cursor)
+            return obj
         obj = OrderedDict()
         for field in self._fields:
             obj[field.name] = field.read_data(D2O_file_binary)
         return obj
 
+    def compile(self, decoders, make=None, intern=False):
+        """Return a function decoding an object of the class from a buffer
+        and a position, returning the object and the position after it.
+
+        Runs of fixed-width fields are decoded by one Struct, vectors of
+        fixed-width values in bulk, objects by the function of their class
+        found in decoders when they are read. make builds the object from
+        the tuple of the values of the fields, an OrderedDict by default.
+        With intern, the decoded strings are interned."""
+        return _compile_class(self.get_schema(), decoders, make, intern)
+
+    def get_record_type(self):
+        """Return a function making a D2ORecord of the class from the
+        values of its fields"""
+        names = [field.name for field in self._fields]
+        record_type = _get_record_type(self._class, tuple(names))
+        if not names:
+            return lambda values: record_type()
+        if not all(name.isidentifier() and not keyword.iskeyword(name)
+                   for name in names):
+            set_fields = [getattr(record_type, name).__set__
+                          for name in names]
+
+            def make(values):
+                record = record_type()
+                for set_field, value in zip(set_fields, values):
+                    set_field(record, value)
+                return record
+            return make
+
+        # Set all the fields in one assignment
+        namespace = dict(record_type=record_type)
+        exec("def make(values):\n"
+             "    record = record_type()\n"
+             "    " + "".join("record." + name + ", " for name in names) +
+             "= values\n"
+             "    return record", namespace)
+        return namespace["make"]
+
+    def get_schema(self):
+        """Return the (name, type id, inner type ids) of the fields"""
+        return tuple((field.name, field.type_id, tuple(field._inner_type_ids))
+                     for field in self._fields)
+
+    def get_spec(self):
+        """Return the class as read from the file: (class id, package, name,
+        (name, type id, inner type names, inner type ids) of the fields)"""
+        return (self._class_id, self._class_pkg, self._class_name,
+                tuple(field.get_spec() for field in self._fields))
+
     def add_field(self, name, D2O_file_binary):
         field = _GameDataField(name, self._d2o_reader)
         field.read_type(D2O_file_binary)
@@ -126,15 +591,22 @@ class _GameDataClassDefinition:
 
 class _GameDataField:
     def __init__(self, name, d2o_reader):
-        self.name = name.decode('utf-8')
+        self._name = name
+        self.name = sys.intern(name.decode('utf-8'))
         self._inner_read_methods = list()
+        self._inner_type_ids = list()
         self._inner_type_names = list()
         self._d2o_reader = d2o_reader
 
     def read_type(self, D2O_file_binary):
         read_id = D2O_file_binary.read_int32()
+        self.type_id = read_id
         self.read_data = self._get_read_method(read_id, D2O_file_binary)
 
+    def get_spec(self):
+        return (self._name, self.type_id, tuple(self._inner_type_names),
+                tuple(self._inner_type_ids))
+
     def _get_read_method(self, read_id, D2O_file_binary):
         if read_id == -1:
             return self._read_integer
@@ -150,9 +622,10 @@ class _GameDataField:
             return self._read_unsigned_integer
         elif read_id == -99:
             self._inner_type_names.append(D2O_file_binary.read_string())
+            inner_id = D2O_file_binary.read_int32()
             self._inner_read_methods = [self._get_read_method(
-                D2O_file_binary.read_int32(),
-                D2O_file_binary)] + self._inner_read_methods
+                inner_id, D2O_file_binary)] + self._inner_read_methods
+            self._inner_type_ids = [inner_id] + self._inner_type_ids
             return self._read_vector
         else:
             if read_id > 0:
@@ -182,6 +655,13 @@ class _GameDataField:
 
     def _read_vector(self, D2O_file_binary, vec_index=0):
         vector_size = D2O_file_binary.read_int32()
+        inner_id = self._inner_type_ids[vec_index]
+        if inner_id == -1 or inner_id == -5:
+            return D2O_file_binary.read_int32_array(vector_size).tolist()
+        elif inner_id == -6:
+            return D2O_file_binary.read_uint32_array(vector_size).tolist()
+        elif inner_id == -4:
+            return D2O_file_binary.read_double_array(vector_size).tolist()
         vector = list()
         i = 0
         while i < vector_size:
@@ -198,9 +678,718 @@ class _GameDataField:
         return obj.read(D2O_file_binary)
 
 
+class D2ORecord:
+    """Object of a D2O class decoded in compact mode. Its fields are the
+    __slots__ of the record type of the class, read as attributes or by
+    name like an OrderedDict. Like namedtuple, the helpers are prefixed
+    with an underscore so they never clash with the fields."""
+    __slots__ = ()
+
+    def __getitem__(self, name):
+        if name not in type(self).__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name):
+        return name in type(self).__slots__
+
+    def __iter__(self):
+        return iter(type(self).__slots__)
+
+    def __len__(self):
+        return len(type(self).__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, D2ORecord) and \
+            type(self)._class == type(other)._class and \
+            D2ORecord._items(self) == D2ORecord._items(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (_make_record, (type(self)._class, type(self).__slots__,
+                               tuple(D2ORecord._values(self))))
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(
+            name + "=" + repr(value)
+            for name, value in D2ORecord._items(self)) + ")"
+
+    def _get(self, name, default=None):
+        if name not in type(self).__slots__:
+            return default
+        return getattr(self, name)
+
+    def _keys(self):
+        return list(type(self).__slots__)
+
+    def _values(self):
+        return [getattr(self, name) for name in type(self).__slots__]
+
+    def _items(self):
+        return [(name, getattr(self, name)) for name in type(self).__slots__]
+
+    def _asdict(self):
+        """Return the record as an OrderedDict, like the objects decoded
+        by default, nested records included"""
+        return OrderedDict((name, _record_to_dict(value))
+                           for name, value in D2ORecord._items(self))
+
+
+_RECORD_TYPES = dict()
+
+
+def _get_record_type(class_name, names):
+    """Return the record type of a class with the given field names, the
+    same for all the readers"""
+    key = (class_name, names)
+    if key not in _RECORD_TYPES:
+        _RECORD_TYPES.setdefault(key, type(
+            class_name.rsplit('.', 1)[-1], (D2ORecord,),
+            dict(__slots__=names, _class=class_name)))
+    return _RECORD_TYPES[key]
+
+
+def _make_record(class_name, names, values):
+    """Rebuild a pickled D2ORecord"""
+    record = _get_record_type(class_name, names)()
+    for name, value in zip(names, values):
+        setattr(record, name, value)
+    return record
+
+
+def _record_to_dict(value):
+    if isinstance(value, D2ORecord):
+        return D2ORecord._asdict(value)
+    elif isinstance(value, list):
+        return [_record_to_dict(item) for item in value]
+    return value
+
+
+class D2OSchemaRegistry:
+    """Class definitions shared by D2O readers, keyed by the package, name
+    and fields of each class.
+
+    The readers of files with the same classes share their decoders. The
+    classes are saved to path as JSON, and compile() compiles the decoders
+    of all the saved classes: the readers of this process, and the worker
+    processes forked after it, then don't compile them again. Each reader
+    still parses its class table and builds its own class definitions,
+    which is cheaper than looking them up."""
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._classes = dict()
+        self._decoders = dict()
+        if path is not None:
+            self._load(path)
+
+    def __len__(self):
+        return len(self._classes)
+
+    def save(self, path=None):
+        """Save the classes, merged with the ones already saved to path by
+        other processes"""
+        path = path or self._path
+        if path is None:
+            raise ValueError("No path to save the schema registry to.")
+        self._load(path)
+        with self._lock:
+            classes = [OrderedDict([("package", class_pkg.decode('utf-8')),
+                                    ("name", class_name.decode('utf-8')),
+                                    ("fields", [_get_field_json(field)
+                                                for field in fields])])
+                       for class_pkg, class_name, fields in self._classes]
+        _replace_file(path, json.dumps(classes).encode('utf-8'))
+
+    def compile(self, compact=False):
+        """Compile the code of the decoders of all the classes, as used by
+        the readers in compact mode or not"""
+        with self._lock:
+            classes = list(self._classes)
+        for class_pkg, class_name, fields in classes:
+            _get_decoder_code(_get_kinds(field[1] for field in fields),
+                              compact)
+
+    def _load(self, path):
+        try:
+            with open(path, "rb") as stream:
+                classes = [(class_json["package"].encode(),
+                            class_json["name"].encode(),
+                            tuple(_get_field_spec(field)
+                                  for field in class_json["fields"]))
+                           for class_json in json.loads(stream.read())]
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return
+        with self._lock:
+            for key in classes:
+                self._classes.setdefault(key, key)
+
+    def _get_decoders(self, specs, compact, compile_decoders):
+        """Return the decoders of the classes given by their specs, compiled
+        by compile_decoders for the first reader with these classes"""
+        with self._lock:
+            table = list()
+            for class_id, class_pkg, class_name, fields in specs:
+                key = (class_pkg, class_name, fields)
+                table.append((class_id, self._classes.setdefault(key, key)))
+            key = (tuple(table), compact)
+            if key not in self._decoders:
+                self._decoders[key] = compile_decoders()
+            return self._decoders[key]
+
+    # Accessors
+
+    def _get_path(self):
+        return self._path
+
+    # Properties
+
+    path = property(_get_path)
+
+
+class D2OTable:
+    """Columns of the objects of a D2O class, in the order of the index.
+
+    int, uint, double, bool and i18n fields are NumPy arrays. String fields
+    are (offsets, data) arrays, the utf-8 bytes of the row i being
+    data[offsets[i]:offsets[i + 1]]. Vector fields are (offsets, values),
+    values being the column of the inner type. Object fields are object
+    arrays of the decoded objects."""
+    def __init__(self, class_name, ids, columns):
+        self._class = class_name
+        self._ids = ids
+        self._columns = columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get_strings(self, name):
+        """Return the decoded values of a string column"""
+        offsets, data = self._columns[name]
+        data = data.tobytes()
+        return [data[start:end].decode('utf-8')
+                for start, end in zip(offsets[:-1].tolist(),
+                                      offsets[1:].tolist())]
+
+    def save(self, path):
+        """Save the table to a .npz file, or to a folder of .npy files which
+        can be loaded as memory maps"""
+        arrays = OrderedDict()
+        arrays["__class__"] = numpy.array(self._class)
+        arrays["__fields__"] = numpy.array(list(self._columns), str)
+        arrays["__ids__"] = self._ids
+        for name, column in self._columns.items():
+            _flatten_column(name, column, arrays)
+
+        if path.endswith(".npz"):
+            numpy.savez(path, **arrays)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for key, array in arrays.items():
+                numpy.save(os.path.join(path, key + ".npy"), array)
+
+    @classmethod
+    def load(cls, path, mapped=False):
+        """Load a table saved by save, with memory maps of the .npy files of
+        a folder when mapped is True"""
+        if numpy is None:
+            raise ImportError("NumPy is required by the columnar export.")
+        if path.endswith(".npz"):
+            with numpy.load(path) as npz:
+                arrays = dict((key, npz[key]) for key in npz.files)
+        else:
+            arrays = dict(
+                (file[:-4], numpy.load(os.path.join(path, file),
+                                       "r" if mapped else None))
+                for file in os.listdir(path) if file.endswith(".npy"))
+
+        columns = OrderedDict((name, _unflatten_column(name, arrays))
+                              for name in arrays["__fields__"].tolist())
+        return cls(str(arrays["__class__"]), arrays["__ids__"], columns)
+
+    # Accessors
+
+    def _get_class_name(self):
+        return self._class
+
+    def _get_ids(self):
+        return self._ids
+
+    def _get_columns(self):
+        return self._columns
+
+    # Properties
+
+    class_name = property(_get_class_name)
+    ids = property(_get_ids)
+    columns = property(_get_columns)
+
+
+def _make_column(type_id, inner_type_ids, values):
+    """Convert the values of a field to a column of D2OTable"""
+    if type_id in _FIXED_FORMATS:
+        return numpy.array(values, _FIXED_FORMATS[type_id])
+    elif type_id == -3:
+        encoded = [value.encode('utf-8') for value in values]
+        return (_make_offsets(encoded),
+                numpy.frombuffer(b"".join(encoded), numpy.uint8))
+    elif type_id == -99:
+        return (_make_offsets(values),
+                _make_column(inner_type_ids[0], inner_type_ids[1:],
+                             list(chain.from_iterable(values))))
+    column = numpy.empty(len(values), object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+def _make_offsets(values):
+    offsets = numpy.zeros(len(values) + 1, numpy.int64)
+    numpy.cumsum([len(value) for value in values], out=offsets[1:])
+    return offsets
+
+
+def _flatten_column(key, column, arrays):
+    """Add the arrays of a column to arrays, the keys of the arrays of a
+    string or vector column being suffixed by .offsets and .data or
+    .values, object columns being saved as strings of JSON"""
+    if isinstance(column, tuple):
+        offsets, data = column
+        arrays[key + ".offsets"] = offsets
+        if isinstance(data, tuple) or data.dtype != numpy.uint8:
+            _flatten_column(key + ".values", data, arrays)
+        else:
+            arrays[key + ".data"] = data
+    elif column.dtype == object:
+        _flatten_column(key + ".json",
+                        _make_column(-3, (), [
+                            json.dumps(_record_to_dict(value))
+                            for value in column]),
+                        arrays)
+    else:
+        arrays[key] = column
+
+
+def _unflatten_column(key, arrays):
+    if key in arrays:
+        return arrays[key]
+    elif key + ".data" in arrays:
+        return arrays[key + ".offsets"], arrays[key + ".data"]
+    elif key + ".json.offsets" in arrays:
+        values = D2OTable(None, None, OrderedDict(
+            json=_unflatten_column(key + ".json", arrays))).get_strings("json")
+        return _make_column(1, (), [
+            json.loads(value, object_pairs_hook=OrderedDict)
+            for value in values])
+    return arrays[key + ".offsets"], _unflatten_column(key + ".values",
+                                                        arrays)
+
+
+def _diff_objects(old, new):
+    """Return the objects added, removed and changed from old to new, paired
+    by id. The encoded bytes of the objects are compared first, and only the
+    objects whose bytes differ are decoded, unless the class tables differ.
+    Changed objects come with the old and new values of their changed
+    fields."""
+    old_ranges = old._get_ranges()
+    new_ranges = new._get_ranges()
+    same_classes = [class_def.get_spec()
+                    for class_def in old._classes.values()] == \
+        [class_def.get_spec() for class_def in new._classes.values()]
+
+    manifest = OrderedDict()
+    manifest["added"] = list()
+    manifest["removed"] = list()
+    manifest["changed"] = list()
+
+    for object_id, (start, end) in new_ranges.items():
+        if object_id not in old_ranges:
+            manifest["added"].append(OrderedDict(
+                [("id", object_id),
+                 ("object", _record_to_dict(new.get_object(object_id)))]))
+            continue
+
+        old_start, old_end = old_ranges[object_id]
+        if same_classes and \
+                old._data[old_start:old_end] == new._data[start:end]:
+            continue
+
+        fields = _diff_fields(_record_to_dict(old.get_object(object_id)),
+                              _record_to_dict(new.get_object(object_id)))
+        if fields:
+            manifest["changed"].append(OrderedDict(
+                [("id", object_id), ("fields", fields)]))
+
+    for object_id in old_ranges:
+        if object_id not in new_ranges:
+            manifest["removed"].append(object_id)
+
+    return manifest
+
+
+def _diff_fields(old_object, new_object):
+    """Return the old and new values of the fields which differ, None
+    standing for a field missing on one side"""
+    fields = OrderedDict()
+    for name in new_object.keys():
+        old_value = old_object.get(name)
+        new_value = new_object[name]
+        if name not in old_object or old_value != new_value:
+            fields[name] = OrderedDict([("old", old_value),
+                                        ("new", new_value)])
+    for name in old_object.keys():
+        if name not in new_object:
+            fields[name] = OrderedDict([("old", old_object[name]),
+                                        ("new", None)])
+    return fields
+
+
+# Compiled decoders
+
+_INT32 = _BIG_ENDIAN_STRUCTS["i"]
+_UINT16 = _BIG_ENDIAN_STRUCTS["H"]
+_NULL_OBJECT = -1431655766
+_SHORT_VECTOR = 32
+
+# Fixed-width field types: int, bool, number, i18n and uint
+_FIXED_FORMATS = {-1: "i", -2: "?", -4: "d", -5: "i", -6: "I"}
+
+_DECODER_GLOBALS = {"Struct": Struct, "UINT16": _UINT16, "intern": sys.intern}
+_DECODER_CODES = dict()
+
+
+def _get_decoder_code(kinds, intern):
+    """Compile the code of a decoder factory for a class whose fields are
+    of the given kinds: a fixed-width struct format, "s" for a string or
+    "r" for a field decoded by a reader function"""
+    key = (kinds, intern)
+    if key in _DECODER_CODES:
+        return _DECODER_CODES[key]
+
+    setup = list()
+    body = list()
+    run = ""
+    run_start = 0
+    reader_index = 0
+
+    for index, kind in enumerate(kinds + ("",)):
+        if kind not in ("s", "r", ""):
+            if not run:
+                run_start = index
+            run += kind
+            continue
+
+        if run:
+            struct_name = "S" + str(len(setup))
+            setup.append("    " + struct_name + " = Struct('>" + run + "')")
+            values = ", ".join("v" + str(i)
+                               for i in range(run_start, run_start + len(run)))
+            body.append("        " + values + ", = " + struct_name +
+                        ".unpack_from(buffer, position)")
+            body.append("        position += " + str(calcsize(">" + run)))
+            run = ""
+
+        if kind == "s":
+            value = "str(buffer[position:position + length], 'utf-8')"
+            if intern:
+                value = "intern(" + value + ")"
+            body.append("        length = UINT16.unpack_from(buffer, "
+                        "position)[0]")
+            body.append("        position += 2")
+            body.append("        v" + str(index) + " = " + value)
+            body.append("        position += length")
+        elif kind == "r":
+            reader_name = "R" + str(reader_index)
+            setup.append("    " + reader_name + " = readers[" +
+                         str(reader_index) + "]")
+            body.append("        v" + str(index) + ", position = " +
+                        reader_name + "(buffer, position)")
+            reader_index += 1
+
+    values = "".join("v" + str(i) + ", " for i in range(len(kinds)))
+    source = "\n".join(
+        ["def factory(readers, make):"] + setup +
+        ["    def decode(buffer, position):"] + body +
+        ["        return make((" + values + ")), position",
+         "    return decode"])
+
+    code = compile(source, "<d2o decoder>", "exec")
+    _DECODER_CODES[key] = code
+    return code
+
+
+def _get_kinds(type_ids):
+    """Return the kinds of fields of the given types, as taken by
+    _get_decoder_code"""
+    return tuple(_FIXED_FORMATS.get(type_id, "s" if type_id == -3 else "r")
+                 for type_id in type_ids)
+
+
+def _compile_class(schema, decoders, make=None, intern=False):
+    """Compile the decoder of a class from the schema of its fields"""
+    if make is None:
+        names = tuple(name for name, type_id, inner_type_ids in schema)
+        make = lambda values: OrderedDict(zip(names, values))
+
+    kinds = _get_kinds(type_id for name, type_id, inner_type_ids in schema)
+    readers = [_make_reader(type_id, inner_type_ids, decoders, intern)
+               for (name, type_id, inner_type_ids), kind in zip(schema, kinds)
+               if kind == "r"]
+
+    namespace = dict(_DECODER_GLOBALS)
+    exec(_get_decoder_code(kinds, intern), namespace)
+    return namespace["factory"](readers, make)
+
+
+def _make_reader(type_id, inner_type_ids, decoders, intern):
+    """Return a function decoding a value of a string, object or vector
+    type from a buffer and a position, returning the value and the position
+    after it"""
+    if type_id == -3:
+        def read_string(buffer, position):
+            length = _UINT16.unpack_from(buffer, position)[0]
+            position += 2
+            value = str(buffer[position:position + length], 'utf-8')
+            if intern:
+                value = sys.intern(value)
+            return value, position + length
+        return read_string
+
+    elif type_id == -99:
+        inner_id = inner_type_ids[0]
+
+        if inner_id == -2:
+            def read_bool_vector(buffer, position):
+                count = _INT32.unpack_from(buffer, position)[0]
+                position += 4
+                return (list(map(bool, buffer[position:position + count])),
+                        position + count)
+            return read_bool_vector
+
+        elif inner_id in _FIXED_FORMATS:
+            fmt = _FIXED_FORMATS[inner_id]
+            size = calcsize(fmt)
+            # Short vectors are cheaper to unpack with a Struct by length
+            structs = [Struct(">" + str(count) + fmt)
+                       for count in range(_SHORT_VECTOR)]
+
+            def read_fixed_vector(buffer, position):
+                count = _INT32.unpack_from(buffer, position)[0]
+                position += 4
+                end = position + size * count
+                if count < _SHORT_VECTOR:
+                    return list(structs[count].unpack_from(buffer,
+                                                           position)), end
+                return (_decode_array(fmt, buffer[position:end], count,
+                                      True).tolist(), end)
+            return read_fixed_vector
+
+        else:
+            read_inner = _make_reader(inner_id, inner_type_ids[1:], decoders,
+                                      intern)
+
+            def read_vector(buffer, position):
+                count = _INT32.unpack_from(buffer, position)[0]
+                position += 4
+                vector = list()
+                i = 0
+                while i < count:
+                    value, position = read_inner(buffer, position)
+                    vector.append(value)
+                    i += 1
+                return vector, position
+            return read_vector
+
+    elif type_id > 0:
+        def read_object(buffer, position):
+            class_id = _INT32.unpack_from(buffer, position)[0]
+            position += 4
+            if class_id == _NULL_OBJECT:
+                return None, position
+            return decoders[class_id](buffer, position)
+        return read_object
+
+    raise Exception("Unknown type '" + str(type_id) + "'.")
+
+
+# Compiled encoders
+
+_ENCODER_GLOBALS = {"Struct": Struct, "UINT16": _UINT16}
+_ENCODER_CODES = dict()
+
+
+def _get_encoder_code(kinds):
+    """Compile the code of an encoder factory for a class whose fields are
+    of the given kinds, see _get_decoder_code"""
+    if kinds in _ENCODER_CODES:
+        return _ENCODER_CODES[kinds]
+
+    setup = ["    N" + str(i) + " = names[" + str(i) + "]"
+             for i in range(len(kinds))]
+    body = list()
+    run = list()
+    writer_index = 0
+
+    for index, kind in enumerate(kinds + ("",)):
+        if kind not in ("s", "r", ""):
+            run.append((index, kind))
+            continue
+
+        if run:
+            struct_name = "S" + str(len(setup))
+            setup.append("    " + struct_name + " = Struct('>" +
+                         "".join(fmt for i, fmt in run) + "')")
+            body.append("        out += " + struct_name + ".pack(" +
+                        ", ".join("obj[N" + str(i) + "]" for i, fmt in run) +
+                        ")")
+            run = list()
+
+        if kind == "s":
+            body.append("        value = obj[N" + str(index) +
+                        "].encode('utf-8')")
+            body.append("        out += UINT16.pack(len(value))")
+            body.append("        out += value")
+        elif kind == "r":
+            writer_name = "W" + str(writer_index)
+            setup.append("    " + writer_name + " = writers[" +
+                         str(writer_index) + "]")
+            body.append("        " + writer_name + "(out, obj[N" +
+                        str(index) + "])")
+            writer_index += 1
+
+    source = "\n".join(
+        ["def factory(writers, names):"] + setup +
+        ["    def encode(out, obj):"] + (body or ["        pass"]) +
+        ["    return encode"])
+
+    code = compile(source, "<d2o encoder>", "exec")
+    _ENCODER_CODES[kinds] = code
+    return code
+
+
+def _compile_encoder(schema, encoders, get_class_id):
+    """Compile the encoder of a class from the schema of its fields, a
+    function appending the fields of an object to a bytearray"""
+    kinds = list()
+    writers = list()
+    for name, type_id, inner_type_ids in schema:
+        if type_id in _FIXED_FORMATS:
+            kinds.append(_FIXED_FORMATS[type_id])
+        elif type_id == -3:
+            kinds.append("s")
+        else:
+            kinds.append("r")
+            writers.append(_make_writer(type_id, inner_type_ids, encoders,
+                                        get_class_id))
+
+    namespace = dict(_ENCODER_GLOBALS)
+    exec(_get_encoder_code(tuple(kinds)), namespace)
+    return namespace["factory"](writers, tuple(name for name, type_id,
+                                               inner_type_ids in schema))
+
+
+def _make_writer(type_id, inner_type_ids, encoders, get_class_id):
+    """Return a function appending a value of a string, object or vector
+    type to a bytearray"""
+    if type_id == -3:
+        def write_string(out, value):
+            value = value.encode('utf-8')
+            out += _UINT16.pack(len(value))
+            out += value
+        return write_string
+
+    elif type_id == -99:
+        inner_id = inner_type_ids[0]
+
+        if inner_id == -2:
+            def write_bool_vector(out, vector):
+                out += _INT32.pack(len(vector))
+                out += bytes(map(bool, vector))
+            return write_bool_vector
+
+        elif inner_id in _FIXED_FORMATS:
+            fmt = _FIXED_FORMATS[inner_id]
+
+            def write_fixed_vector(out, vector):
+                out += _INT32.pack(len(vector))
+                out += pack(">" + str(len(vector)) + fmt, *vector)
+            return write_fixed_vector
+
+        else:
+            write_inner = _make_writer(inner_id, inner_type_ids[1:],
+                                       encoders, get_class_id)
+
+            def write_vector(out, vector):
+                out += _INT32.pack(len(vector))
+                for value in vector:
+                    write_inner(out, value)
+            return write_vector
+
+    elif type_id > 0:
+        def write_object(out, value):
+            if value is None:
+                out += _INT32.pack(_NULL_OBJECT)
+                return
+            class_id = get_class_id(value, type_id)
+            out += _INT32.pack(class_id)
+            encoders[class_id](out, value)
+        return write_object
+
+    raise Exception("Unknown type \'" + str(type_id) + "\'.")
+
+
+# Parallel decoding, state of a worker process
+
+_PARALLEL_STATE = dict()
+
+
+def _parallel_init(path, schema):
+    with open(path, "rb") as stream:
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    decoders = dict()
+    for class_id, fields in schema.items():
+        decoders[class_id] = _compile_class(fields, decoders)
+    _PARALLEL_STATE["buffer"] = memoryview(data)
+    _PARALLEL_STATE["decoders"] = decoders
+
+
+def _parallel_decode(positions):
+    buffer = _PARALLEL_STATE["buffer"]
+    decoders = _PARALLEL_STATE["decoders"]
+    objects = list()
+    for position in positions:
+        class_id = _INT32.unpack_from(buffer, position)[0]
+        objects.append(decoders[class_id](buffer, position + 4)[0])
+    return objects
+
+
+# Read methods of the values of the search tables by field type
+_SEARCH_READ_METHODS = {-1: "read_int32", -2: "read_bool", -3: "read_string",
+                        -4: "read_double", -5: "read_int32",
+                        -6: "read_uint32"}
+
+
+# Write methods of the values of the search tables by field type
+_SEARCH_WRITE_METHODS = {-1: "write_int32", -2: "write_bool",
+                         -3: "write_string", -4: "write_double",
+                         -5: "write_int32", -6: "write_uint32"}
+
+
 class _GameDataProcess:
     def __init__(self, D2O_file_binary):
         self._stream = D2O_file_binary
+        self._buffer = D2O_file_binary._buffer
+        self._values = dict()
         self._sort_index = OrderedDict()
         self._queryable_field = list()
         self._search_field_index = OrderedDict()
@@ -213,9 +1402,57 @@ class _GameDataProcess:
         off = self._stream.position() + length + 4
         while length:
             available = self._stream.bytes_available()
-            string = self._stream.read_string()
+            string = self._stream.read_string().decode('utf-8')
             self._queryable_field.append(string)
             self._search_field_index[string] = self._stream.read_int32() + off
             self._search_field_type[string] = self._stream.read_int32()
             self._search_field_count[string] = self._stream.read_int32()
             length = length - (available - self._stream.bytes_available())
+
+    def query(self, field, match):
+        """Return the ids of the objects whose field is equal to match, or
+        for which match returns True when it is a function"""
+        values = self._get_values(field)
+        if not callable(match):
+            if match not in values:
+                return list()
+            return self._read_ids(*values[match])
+        ids = list()
+        for value, ids_position in values.items():
+            if match(value):
+                ids.extend(self._read_ids(*ids_position))
+        return sorted(set(ids))
+
+    def _get_values(self, field):
+        """Return the values of the search table of a field with the
+        position and number of their ids, read on the first query"""
+        values = self._values.get(field)
+        if values is None:
+            values = self._values[field] = self._read_values(field)
+        return values
+
+    def _read_values(self, field):
+        field_type = self._search_field_type[field]
+        if field_type not in _SEARCH_READ_METHODS:
+            raise InvalidD2OFile("Unknown search type \'" +
+                                 str(field_type) + "\'.")
+        D2O_file_binary = _BinaryBuffer(self._buffer, True)
+        D2O_file_binary.position(self._search_field_index[field])
+        read_value = getattr(D2O_file_binary, _SEARCH_READ_METHODS[field_type])
+
+        values = dict()
+        i = 0
+        while i < self._search_field_count[field]:
+            value = read_value()
+            if field_type == -3:
+                value = value.decode('utf-8')
+            length = D2O_file_binary.read_int32()
+            values[value] = (D2O_file_binary.position(), length // 4)
+            D2O_file_binary.position(D2O_file_binary.position() + length)
+            i += 1
+        return values
+
+    def _read_ids(self, position, count):
+        D2O_file_binary = _BinaryBuffer(self._buffer, True)
+        D2O_file_binary.position(position)
+        return D2O_file_binary.read_int32_array(count).tolist()
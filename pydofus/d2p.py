@@ -1,8 +1,16 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from ._binarystream import _BinaryStream
+import hashlib, io, mmap, os, shutil, tempfile, threading
+from struct import error
+from ._binarystream import _BinaryStream, _BinaryBuffer, _BinaryBuilder, \
+    _replace_file
 from collections import OrderedDict
+from functools import partial
+
+_INDEX_CACHE_MAGIC = b"D2PI"
+_COPY_CHUNK_SIZE = 1024 * 1024
+_MISSING = object()
 
 # Exceptions
 
@@ -17,10 +25,32 @@ class InvalidD2PFile(Exception):
 
 class D2PReader:
     """Read D2P files"""
-    def __init__(self, stream, autoload=True):
-        """Init the class with the informations about files in the D2P"""
+    def __init__(self, stream, autoload=True, mapped=False, index_cache=None,
+                 cache_size=0):
+        """Init the class with the informations about files in the D2P
+
+        With mapped, the archive is memory-mapped read-only and load()
+        exposes each file as a memoryview slice over the mapping, so the
+        pages are only read on access and are shared through the page cache
+        with every process mapping the same archive.
+
+        index_cache is the path of a sidecar file caching the index, used
+        instead of the index of the D2P while the archive path, size and
+        mtime match, and rebuilt otherwise. Streams without a file
+        descriptor, like BytesIO, can't be mapped and are read unmapped.
+
+        With cache_size, the files returned by read() are kept in a D2PCache
+        of at most cache_size bytes."""
         # Attributes
         self._stream = stream
+        self._mmap = None
+        self._handle = _D2PHandle(stream)
+        self._mapped = mapped and self._handle.fileno is not None
+        mapped = self._mapped
+
+        self._cache = None
+        if cache_size and not mapped:
+            self._cache = D2PCache(cache_size)
 
         self._base_offset = None
         self._base_length = None
@@ -48,6 +78,24 @@ class D2PReader:
             raise InvalidD2PFile("The first bytes don't match the"
                                  " SWL pattern.")
 
+        index_cache_key = None
+        if index_cache is not None:
+            index_cache_key = self._get_index_cache_key()
+
+        if ((index_cache_key is None or
+             not self._read_index_cache(index_cache, index_cache_key))):
+            self._read_index(D2P_file_binary)
+            if index_cache_key is not None:
+                self._write_index_cache(index_cache, index_cache_key)
+
+        if mapped:
+            self._mmap = mmap.mmap(self._handle.fileno, 0,
+                                   access=mmap.ACCESS_READ)
+
+        if autoload:
+            self.load()
+
+    def _read_index(self, D2P_file_binary):
         self._stream.seek(-24, 2)  # Set position to end - 24 bytes
 
         self._base_offset = D2P_file_binary.read_uint32()
@@ -63,7 +111,12 @@ class D2PReader:
              self._number_properties == b"")):
             raise InvalidD2PFile("The file doesn't match the D2P pattern.")
 
+        # Read indexes and properties in one go, they are followed only by
+        # the 24 bytes trailer
+        trailer_offset = self._stream.tell() - 24
         self._stream.seek(self._indexes_offset, 0)
+        D2P_index_binary = _BinaryBuffer(
+            self._stream.read(trailer_offset - self._indexes_offset), True)
 
         # Read indexes
 
@@ -71,9 +124,9 @@ class D2PReader:
 
         i = 0
         while i < self._number_indexes:
-            file_name = (D2P_file_binary.read_string()).decode()
-            offset = D2P_file_binary.read_int32()
-            length = D2P_file_binary.read_int32()
+            file_name = (D2P_index_binary.read_string()).decode()
+            offset = D2P_index_binary.read_int32()
+            length = D2P_index_binary.read_int32()
             if file_name == b"" or offset == b"" or length == b"":
                 raise InvalidD2PFile("The file appears to be corrupt.")
             self._files_position[file_name] = {
@@ -83,7 +136,8 @@ class D2PReader:
 
             i += 1
 
-        self._stream.seek(self._properties_offset, 0)
+        D2P_index_binary.position(self._properties_offset -
+                                  self._indexes_offset)
 
         # Read properties
 
@@ -91,16 +145,109 @@ class D2PReader:
 
         i = 0
         while i < self._number_properties:
-            property_type = (D2P_file_binary.read_string()).decode()
-            property_value = (D2P_file_binary.read_string()).decode()
+            property_type = (D2P_index_binary.read_string()).decode()
+            property_value = (D2P_index_binary.read_string()).decode()
             if property_type == b"" or property_value == b"":
                 raise InvalidD2PFile("The file appears to be corrupt.")
             self._properties[property_type] = property_value
 
             i += 1
 
-        if autoload:
-            self.load()
+    # Index cache
+
+    def _get_index_cache_key(self):
+        if self._handle.fileno is None:
+            return None
+        stat = os.fstat(self._handle.fileno)
+        name = getattr(self._stream, "name", "")
+        if isinstance(name, str):
+            name = os.path.abspath(name)
+        else:
+            name = ""
+        return (stat.st_size, stat.st_mtime_ns, name.encode())
+
+    def _read_index_cache(self, path, key):
+        """Load the index from the sidecar cache, False if it is missing or
+        stale"""
+        try:
+            with open(path, "rb") as cache:
+                raw = _BinaryBuffer(cache.read(), True)
+
+            if raw.read_bytes(4) != _INDEX_CACHE_MAGIC:
+                return False
+            if ((raw.read_uint64(), raw.read_uint64(), raw.read_string()) !=
+                    key):
+                return False
+
+            base_offset = raw.read_uint32()
+            base_length = raw.read_uint32()
+            indexes_offset = raw.read_uint32()
+            number_indexes = raw.read_uint32()
+            properties_offset = raw.read_uint32()
+            number_properties = raw.read_uint32()
+
+            number_files = raw.read_uint32()
+            names = raw.read_string_bytes(raw.read_uint32()).decode()
+            names = names.split("\0") if number_files else []
+            offsets = raw.read_int32_array(number_files).tolist()
+            lengths = raw.read_int32_array(number_files).tolist()
+
+            properties = OrderedDict()
+            i = 0
+            while i < number_properties:
+                property_type = raw.read_string().decode()
+                properties[property_type] = raw.read_string().decode()
+                i += 1
+        except (OSError, ValueError, error):
+            return False
+
+        if len(names) != number_files:
+            return False
+
+        self._base_offset = base_offset
+        self._base_length = base_length
+        self._indexes_offset = indexes_offset
+        self._number_indexes = number_indexes
+        self._properties_offset = properties_offset
+        self._number_properties = number_properties
+        self._files_position = OrderedDict(
+            (file_name, {"offset": offset, "length": length})
+            for file_name, offset, length in zip(names, offsets, lengths))
+        self._properties = properties
+
+        return True
+
+    def _write_index_cache(self, path, key):
+        """Write the sidecar cache: the trailer, then the names and two
+        int32 arrays of offsets and lengths that can be read in bulk"""
+        raw = _BinaryBuilder(True)
+
+        raw.write_bytes(_INDEX_CACHE_MAGIC)
+        raw.write_uint64(key[0])
+        raw.write_uint64(key[1])
+        raw.write_string(key[2])
+
+        raw.write_uint32(self._base_offset)
+        raw.write_uint32(self._base_length)
+        raw.write_uint32(self._indexes_offset)
+        raw.write_uint32(self._number_indexes)
+        raw.write_uint32(self._properties_offset)
+        raw.write_uint32(len(self._properties))
+
+        names = "\0".join(self._files_position).encode()
+        raw.write_uint32(len(self._files_position))
+        raw.write_uint32(len(names))
+        raw.write_bytes(names)
+        for position in self._files_position.values():
+            raw.write_int32(position["offset"])
+        for position in self._files_position.values():
+            raw.write_int32(position["length"])
+
+        for property_type, property_value in self._properties.items():
+            raw.write_string(property_type.encode())
+            raw.write_string(property_value.encode())
+
+        _replace_file(path, raw.getvalue())
 
     def load(self):
         """Load the class with the actual D2P files in it"""
@@ -109,18 +256,83 @@ class D2PReader:
         if self._loaded:
             raise Exception("D2P instance is already populated.")
 
-        D2P_file_binary = _BinaryStream(self._stream, True)
-
         self._files = OrderedDict()
 
-        for file_name, position in self._files_position.items():
-            self._stream.seek(position["offset"], 0)
+        if self._mapped:
+            view = memoryview(self._mmap)
+
+            for file_name, position in self._files_position.items():
+                offset = position["offset"]
+                self._files[file_name] = view[offset:
+                                              offset + position["length"]]
+        else:
+            D2P_file_binary = _BinaryStream(self._stream, True)
 
-            self._files[file_name] = (D2P_file_binary.
-                                      read_bytes(position["length"]))
+            for file_name, position in self._files_position.items():
+                self._stream.seek(position["offset"], 0)
+
+                self._files[file_name] = (D2P_file_binary.
+                                          read_bytes(position["length"]))
 
         self._loaded = True
 
+    def read(self, file_name):
+        """Return the content of one file of the D2P without loading the
+        others, a memoryview over the mapping in mapped mode"""
+        if self._loaded:
+            return self._files[file_name]
+        if self._cache is not None:
+            return self._cache.get_or_load(file_name, self._read_file)
+        return self._read_file(file_name)
+
+    def _read_file(self, file_name):
+        position = self._files_position[file_name]
+        return self._read_at(position["offset"], position["length"])
+
+    def open(self, file_name):
+        """Return a read-only file-like object over one file of the D2P"""
+        position = self._files_position[file_name]
+        return _D2PFileStream(self._read_at, position["offset"],
+                              position["length"])
+
+    def extract(self, file_name, target):
+        """Write one file of the D2P in the target stream, copied inside the
+        kernel when both are files"""
+        position = self._files_position[file_name]
+        _copy_range(self._handle, position["offset"], position["length"],
+                    target)
+
+    def __contains__(self, file_name):
+        return file_name in self._files_position
+
+    def diff(self, other):
+        """Compare with another D2P, see _diff_files"""
+        return _diff_files(self, other)
+
+    def _get_lengths(self):
+        return dict((file_name, position["length"]) for file_name, position
+                    in self._files_position.items())
+
+    def _read_at(self, offset, length):
+        if self._mmap is not None:
+            return memoryview(self._mmap)[offset:offset + length]
+        return self._handle.read_at(offset, length)
+
+    def close(self):
+        """Release the loaded files and the memory mapping, if any"""
+        if self._mmap is not None:
+            if self._files:
+                for view in self._files.values():
+                    view.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Slices still used elsewhere, unmapped with them
+            self._mmap = None
+
+        self._files = None
+        self._loaded = False
+
     # Accessors
 
     def _get_stream(self):
@@ -142,19 +354,443 @@ class D2PReader:
     def _get_loaded(self):
         return self._loaded
 
+    def _get_mapped(self):
+        return self._mapped
+
+    def _get_cache(self):
+        return self._cache
+
     # Properties
 
     stream = property(_get_stream)
     properties = property(_get_properties)
     files = property(_get_files)
     loaded = property(_get_loaded)
+    mapped = property(_get_mapped)
+    cache = property(_get_cache)
+
+
+class D2PCache:
+    """Thread-safe LRU cache holding at most max_bytes, as measured by
+    sizeof, used for the files of a D2PReader and usable for the objects
+    decoded from them"""
+    def __init__(self, max_bytes, sizeof=len):
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._values = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            self._values.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._values:
+                self._bytes -= self._values.pop(key)[1]
+            if size > self._max_bytes:
+                return
+            self._values[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                evicted_value, evicted_size = self._values.popitem(False)[1]
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def get_or_load(self, key, load):
+        """Return the cached value of key, or cache and return load(key)"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    # Accessors
+
+    def _get_max_bytes(self):
+        return self._max_bytes
+
+    def _get_bytes(self):
+        return self._bytes
+
+    def _get_hits(self):
+        return self._hits
+
+    def _get_misses(self):
+        return self._misses
+
+    def _get_evictions(self):
+        return self._evictions
+
+    # Properties
+
+    max_bytes = property(_get_max_bytes)
+    bytes = property(_get_bytes)
+    hits = property(_get_hits)
+    misses = property(_get_misses)
+    evictions = property(_get_evictions)
+
+
+def _diff_files(old, new):
+    """Return the names of the files added, removed and modified from old
+    to new. Only the files with the same length on both sides are read and
+    hashed, from memory-mapped D2P they are hashed without copy."""
+    old_lengths = old._get_lengths()
+    new_lengths = new._get_lengths()
+
+    manifest = OrderedDict()
+    manifest["added"] = list()
+    manifest["removed"] = list()
+    manifest["modified"] = list()
+
+    for file_name, length in new_lengths.items():
+        if file_name not in old_lengths:
+            manifest["added"].append(file_name)
+        elif old_lengths[file_name] != length:
+            manifest["modified"].append(file_name)
+        elif ((_hash_bytes(old.read(file_name)) !=
+               _hash_bytes(new.read(file_name)))):
+            manifest["modified"].append(file_name)
+
+    for file_name in old_lengths:
+        if file_name not in new_lengths:
+            manifest["removed"].append(file_name)
+
+    return manifest
+
+
+def _hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _hash_stream(read):
+    digest = hashlib.blake2b(digest_size=16)
+    chunk = read(_COPY_CHUNK_SIZE)
+    while chunk:
+        digest.update(chunk)
+        chunk = read(_COPY_CHUNK_SIZE)
+    return digest.digest()
+
+
+def _hash_range(read_at, offset, length):
+    digest = hashlib.blake2b(digest_size=16)
+    end = offset + length
+    while offset < end:
+        chunk = read_at(offset, min(_COPY_CHUNK_SIZE, end - offset))
+        if not chunk:
+            break
+        digest.update(chunk)
+        offset += len(chunk)
+    return digest.digest()
+
+
+def _write_spool(spool, target):
+    shutil.copyfileobj(spool, target, _COPY_CHUNK_SIZE)
+    spool.close()
+
+
+def _copy_range(handle, offset, length, target):
+    """Copy length bytes at offset of a D2P handle to the current position
+    of target, inside the kernel when both are files"""
+    try:
+        target_fileno = target.fileno()
+    except (AttributeError, OSError):
+        target_fileno = None
+
+    if handle.fileno is not None and target_fileno is not None:
+        target.flush()
+        position = target.tell()
+        done = 0
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                while done < length:
+                    copied = os.copy_file_range(handle.fileno, target_fileno,
+                                                length - done, offset + done,
+                                                position + done)
+                    if not copied:
+                        break
+                    done += copied
+            except OSError:
+                pass  # Not supported between these files, try sendfile
+
+        if done < length and hasattr(os, "sendfile"):
+            os.lseek(target_fileno, position + done, 0)
+            try:
+                while done < length:
+                    sent = os.sendfile(target_fileno, handle.fileno,
+                                       offset + done, length - done)
+                    if not sent:
+                        break
+                    done += sent
+            except OSError:
+                pass  # Not supported, copy the rest in userspace
+
+        target.seek(position + done)
+        offset += done
+        length -= done
+
+    end = offset + length
+    while offset < end:
+        chunk = handle.read_at(offset, min(_COPY_CHUNK_SIZE, end - offset))
+        if not chunk:
+            break
+        target.write(chunk)
+        offset += len(chunk)
+
+
+class D2PFileSystem:
+    """Read the files of a chain of D2P linked by their "link" property"""
+    def __init__(self, path, max_open=16, index_cache=False):
+        """Open the root D2P, follow its links and index all the files
+
+        A file present in several D2P of the chain is read from the first
+        one. At most max_open D2P stay open, the least recently used are
+        closed and reopened on demand. With index_cache, the index of each
+        D2P is cached in a sidecar file next to it (see D2PReader)."""
+        # Attributes
+        self._max_open = max_open
+        self._archives = list()
+        self._index = OrderedDict()
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Follow the links
+
+        while path is not None and path not in self._archives:
+            stream = open(path, "rb")
+            try:
+                if index_cache:
+                    reader = D2PReader(stream, False,
+                                       index_cache=path + ".idx")
+                else:
+                    reader = D2PReader(stream, False)
+            except Exception:
+                stream.close()
+                raise
+
+            self._archives.append(path)
+            self._put_handle(path, _D2PHandle(stream))
+
+            for file_name, position in reader._files_position.items():
+                if file_name not in self._index:
+                    self._index[file_name] = (path, position["offset"],
+                                              position["length"])
+
+            link = reader.properties.get("link")
+            if link:
+                path = os.path.join(os.path.dirname(path), link)
+            else:
+                path = None
+
+    def read(self, file_name):
+        """Return the content of one file of the chain"""
+        archive, offset, length = self._index[file_name]
+        return self._read_at(archive, offset, length)
+
+    def open(self, file_name):
+        """Return a read-only file-like object over one file of the chain"""
+        archive, offset, length = self._index[file_name]
+        return _D2PFileStream(partial(self._read_at, archive), offset, length)
+
+    def __contains__(self, file_name):
+        return file_name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def diff(self, other):
+        """Compare with another chain of D2P, see _diff_files"""
+        return _diff_files(self, other)
+
+    def _get_lengths(self):
+        return dict((file_name, length) for file_name, (archive, offset, length)
+                    in self._index.items())
+
+    def close(self):
+        """Close all the D2P of the chain"""
+        with self._lock:
+            for handle in self._handles.values():
+                handle.stream.close()
+            self._handles.clear()
+
+    def _read_at(self, archive, offset, length):
+        handle = self._acquire(archive)
+        try:
+            return handle.read_at(offset, length)
+        finally:
+            with self._lock:
+                handle.users -= 1
+                self._evict()
+
+    def _acquire(self, archive):
+        with self._lock:
+            handle = self._handles.get(archive)
+            if handle is None:
+                handle = _D2PHandle(open(archive, "rb"))
+                self._handles[archive] = handle
+            else:
+                self._handles.move_to_end(archive)
+            handle.users += 1
+            self._evict()
+            return handle
+
+    def _put_handle(self, archive, handle):
+        with self._lock:
+            self._handles[archive] = handle
+            self._evict()
+
+    def _evict(self):
+        # Close least recently used D2P, except the ones being read
+        for archive in list(self._handles):
+            if len(self._handles) <= self._max_open:
+                break
+            handle = self._handles[archive]
+            if not handle.users:
+                handle.stream.close()
+                del self._handles[archive]
+
+    # Accessors
+
+    def _get_archives(self):
+        return list(self._archives)
+
+    def _get_files(self):
+        to_return = OrderedDict()
+        for file_name, (archive, offset, length) in self._index.items():
+            to_return[file_name] = {
+                "archive": archive,
+                "position": {"offset": offset, "length": length}
+            }
+
+        return to_return
+
+    # Properties
+
+    archives = property(_get_archives)
+    files = property(_get_files)
+
+
+class _D2PHandle:
+    """Positional reads on a D2P stream"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.users = 0
+        self._lock = threading.Lock()
+
+        try:
+            self.fileno = stream.fileno()
+        except (AttributeError, OSError):
+            self.fileno = None
+
+    def read_at(self, offset, length):
+        # Positional reads don't move a shared cursor, so concurrent reads
+        # from many threads don't need the lock
+        if self.fileno is not None and hasattr(os, "pread"):
+            data = os.pread(self.fileno, length, offset)
+            while len(data) < length:
+                chunk = os.pread(self.fileno, length - len(data),
+                                 offset + len(data))
+                if not chunk:
+                    break
+                data += chunk
+            return data
+
+        with self._lock:
+            self.stream.seek(offset, 0)
+            return self.stream.read(length)
+
+
+class _D2PFileStream(io.RawIOBase):
+    """Read-only file-like object over one file of a D2P"""
+    def __init__(self, read_at, offset, length):
+        super(_D2PFileStream, self).__init__()
+        self._read_at = read_at
+        self._offset = offset
+        self._length = length
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            position = offset
+        elif whence == 1:
+            position = self._position + offset
+        elif whence == 2:
+            position = self._length + offset
+        else:
+            raise ValueError("Invalid whence (" + str(whence) + ").")
+        if position < 0:
+            raise ValueError("Negative seek position " + str(position) + ".")
+        self._position = position
+        return position
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        available = max(self._length - self._position, 0)
+        if size is None or size < 0 or size > available:
+            size = available
+        data = self._read_at(self._offset + self._position, size)
+        self._position += len(data)
+        return bytes(data)
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
 
 
 class D2PBuilder:
     """Build D2P files"""
-    def __init__(self, template, target):
+    def __init__(self, template, target, incremental=False, dedup=False):
+        """With incremental, files whose size and hash match the file of
+        the same name in the template are copied from the template, in
+        ranges as large as possible and in the kernel when available,
+        instead of being rewritten.
+
+        With dedup, files with the same content are written once and all
+        their index entries point to it, saved_bytes gives the bytes saved
+        by the last build."""
         self._template = template
         self._stream = target
+        self._incremental = incremental
+        self._dedup = dedup
+        self._saved_bytes = 0
 
         self._base_offset = None
         self._base_length = None
@@ -166,24 +802,66 @@ class D2PBuilder:
         self._files_position = None
 
         self._files = None
-        self._set_files(self._template.files)  # To update files and position
+        self._set_files(self._template.files)
 
     def build(self):
         """Create the D2P represented by the class in the given stream."""
         if self._template is None:
             raise RuntimeError("Template must be defined to build a D2P file")
 
-        D2P_file_build_binary = _BinaryStream(self._stream, True)
-
-        D2P_file_build_binary.write_bytes(b"\x02\x01")
+        self._stream.write(b"\x02\x01")
 
         self._base_offset = self._stream.tell()
 
+        # Stream each file in the target, recording its position as we go.
+        # Consecutive files taken from the template are copied as one range.
+
+        self._files_position = OrderedDict()
+
+        copy = None  # Template range start, end and target offset
+        written = dict()  # Hash of the files written to their position
+        self._saved_bytes = 0
+
         for file_name, specs in self._files.items():
-            D2P_file_build_binary.write_bytes(specs["binary"])
+            position = self._get_template_position(file_name, specs)
+
+            digest = None
+            if self._dedup:
+                digest, specs = self._get_digest(specs, position)
+                if digest in written:
+                    self._files_position[file_name] = written[digest]
+                    self._saved_bytes += written[digest]["length"]
+                    continue
+
+            if position is not None:
+                start = position["offset"]
+                if copy is None or copy[1] != start:
+                    self._copy_template_range(copy)
+                    copy = [start, start, self._stream.tell()]
+                copy[1] = start + position["length"]
+                offset = copy[2] + start - copy[0]
+                length = position["length"]
+            else:
+                self._copy_template_range(copy)
+                copy = None
+                offset = self._stream.tell()
+                self._write_file(specs)
+                length = self._stream.tell() - offset
+            self._files_position[file_name] = {
+                "offset": offset - self._base_offset,
+                "length": length
+            }
+            if digest is not None:
+                written[digest] = self._files_position[file_name]
+
+        self._copy_template_range(copy)
 
         self._base_length = self._stream.tell() - self._base_offset
 
+        # Build the trailer in memory and flush it in a single write
+
+        D2P_file_build_binary = _BinaryBuilder(True)
+
         self._indexes_offset = self._stream.tell()
         self._number_indexes = 0
 
@@ -193,7 +871,8 @@ class D2PBuilder:
             D2P_file_build_binary.write_int32(position["length"])
             self._number_indexes += 1
 
-        self._properties_offset = self._stream.tell()
+        self._properties_offset = (self._indexes_offset +
+                                   D2P_file_build_binary.position())
         self._number_properties = 0
 
         for ppty_type, ppty_value in self._template._properties.items():
@@ -208,22 +887,86 @@ class D2PBuilder:
         D2P_file_build_binary.write_uint32(self._properties_offset)
         D2P_file_build_binary.write_uint32(self._number_properties)
 
+        D2P_file_build_binary.flush(self._stream)
+
+    def _get_template_position(self, file_name, specs):
+        """Position of the file in the template if it can be copied from
+        it, None if it has to be written. A spec is a template entry only
+        when it has a position and no content."""
+        if not any(key in specs for key in ("binary", "path", "writer")):
+            return specs.get("position")
+        if not self._incremental:
+            return None
+
+        position = self._template._files_position.get(file_name)
+        if position is None:
+            return None
+
+        if "binary" in specs:
+            if len(specs["binary"]) != position["length"]:
+                return None
+            digest = _hash_bytes(specs["binary"])
+        elif "path" in specs:
+            if os.path.getsize(specs["path"]) != position["length"]:
+                return None
+            with open(specs["path"], "rb") as source:
+                digest = _hash_stream(source.read)
+        else:
+            return None
+
+        if digest != _hash_range(self._template._read_at, position["offset"],
+                                 position["length"]):
+            return None
+        return position
+
+    def _get_digest(self, specs, position):
+        """Hash of the content of the file and specs to write it, content
+        given by a writer is spooled to be hashed before being written"""
+        if position is not None:
+            return (_hash_range(self._template._read_at, position["offset"],
+                                position["length"]), specs)
+        if "binary" in specs:
+            return _hash_bytes(specs["binary"]), specs
+        if "path" in specs:
+            with open(specs["path"], "rb") as source:
+                return _hash_stream(source.read), specs
+
+        spool = tempfile.SpooledTemporaryFile(_COPY_CHUNK_SIZE)
+        specs["writer"](spool)
+        spool.seek(0)
+        digest = _hash_stream(spool.read)
+        spool.seek(0)
+        return digest, {"writer": partial(_write_spool, spool)}
+
+    def _copy_template_range(self, copy):
+        if copy is not None:
+            _copy_range(self._template._handle, copy[0], copy[1] - copy[0],
+                        self._stream)
+
+    def _write_file(self, specs):
+        if "binary" in specs:
+            self._stream.write(specs["binary"])
+        elif "path" in specs:
+            with open(specs["path"], "rb") as source:
+                shutil.copyfileobj(source, self._stream, _COPY_CHUNK_SIZE)
+        else:
+            specs["writer"](self._stream)
+
+    # Accessors
+
+    def _get_saved_bytes(self):
+        return self._saved_bytes
+
     # Mutators
 
     def _set_files(self, files):
+        """Set the files to build, as a dict of name to specs with either:
+        "binary", the content; "path", a file streamed in the D2P; "writer",
+        a callable writing the content in the stream given; or "position",
+        a file of the template"""
         self._files = files
-        self._files_position = OrderedDict()
-
-        # Update positions
-        actual_offset = 0
-
-        for file_name, specs in self._files.items():
-            self._files_position[file_name] = {
-                "offset": actual_offset,
-                "length": len(specs["binary"])
-            }
-            actual_offset += self._files_position[file_name]["length"]
 
     # Properties
 
     files = property(None, _set_files)
+    saved_bytes = property(_get_saved_bytes)
@@ -1,8 +1,8 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-import zlib, tempfile, io
-from ._binarystream import _BinaryStream
+import zlib
+from ._binarystream import _BinaryBuffer, _BinaryBuilder, _BUFFER_TYPES
 from collections import OrderedDict
 
 class InvalidDLMFile(Exception):
@@ -19,32 +19,26 @@ class DLM:
         self._key = key
 
     def read(self):
-        dlm_uncompressed = tempfile.TemporaryFile()
-        dlm_uncompressed.write(zlib.decompress(self._stream.read()))
-        dlm_uncompressed.seek(0)
+        if isinstance(self._stream, _BUFFER_TYPES):
+            compressed = self._stream
+        else:
+            compressed = self._stream.read()
 
-        DLM_file_binary = _BinaryStream(dlm_uncompressed, True)
+        DLM_file_binary = _BinaryBuffer(zlib.decompress(compressed), True)
 
         map = Map(DLM_file_binary, self._key)
         map.read()
 
-        dlm_uncompressed.close()
-
         return map.getObj()
 
     def write(self, obj):
-        buffer = tempfile.TemporaryFile()
-        buffer_stream = _BinaryStream(buffer, True)
+        buffer = _BinaryBuilder(True)
 
-        map = Map(buffer_stream, self._key)
+        map = Map(buffer, self._key)
         map.setObj(obj)
         map.write()
 
-        buffer.seek(0)
-
-        self._stream.write(zlib.compress(buffer.read()))
-
-        buffer.close()
+        self._stream.write(zlib.compress(buffer.getvalue()))
 
 class Map:
     def __init__(self, raw, key):
@@ -76,8 +70,7 @@ class Map:
                 for i in range(0, self.dataLen):
                     decryptedData.append(self.encryptedData[i] ^ ord(self._key[i % len(self._key)]))
 
-                cleanData = io.BytesIO(decryptedData)
-                self._raw = _BinaryStream(cleanData, True)
+                self._raw = _BinaryBuffer(decryptedData, True)
 
         self._obj["relativeId"] = self.raw().read_uint32()
         self._obj["mapType"] = self.raw().read_char()
@@ -157,8 +150,7 @@ class Map:
 
     def write(self):
         output_stream = self._raw
-        cleanData = io.BytesIO() #tempfile.TemporaryFile()
-        self._raw = _BinaryStream(cleanData, True)
+        self._raw = _BinaryBuilder(True)
 
         self.raw().write_uint32(self._obj["relativeId"])
         self.raw().write_char(self._obj["mapType"])
@@ -211,9 +203,8 @@ class Map:
         for i in range(0, self._obj["cellsCount"]):
             self._obj["cells"][i].write()
 
-        input_stram = self._raw
+        cleanData = self._raw.getvalue()
         self._raw = output_stream
-        cleanData.seek(0)
 
         self.raw().write_char(self._obj["header"])
         self.raw().write_char(self._obj["mapVersion"])
@@ -222,12 +213,15 @@ class Map:
         if self._obj["mapVersion"] >= 7:
             self.raw().write_bool(self._obj["encrypted"])
             self.raw().write_char(self._obj["encryptionVersion"])
-            self.raw().write_int32(len(cleanData.getbuffer())) # TODO: check len with getBuffer
-            encryptedData = input_stram.read_bytes()
-            for i in range(0, len(cleanData.getbuffer())):
-                self.raw().write_uchar(encryptedData[i] ^ ord(self._key[i % len(self._key)][0]))
+            self.raw().write_int32(len(cleanData))
+            key = bytes(ord(char) for char in self._key)
+            key = key * (len(cleanData) // len(key) + 1)
+            encryptedData = (int.from_bytes(cleanData, "big") ^
+                             int.from_bytes(key[:len(cleanData)], "big"))
+            self.raw().write_bytes(encryptedData.to_bytes(len(cleanData),
+                                                          "big"))
         else:
-            self.raw().write_bytes(input_stram.read_bytes())
+            self.raw().write_bytes(cleanData)
 
     def getObj(self):
         return self._obj
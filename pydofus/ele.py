@@ -1,8 +1,8 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-import zlib, tempfile, io
-from ._binarystream import _BinaryStream
+import zlib
+from ._binarystream import _BinaryBuffer, _BUFFER_TYPES
 from collections import OrderedDict
 
 class InvalidELEFile(Exception):
@@ -15,17 +15,16 @@ class ELE:
         self._stream = stream
 
     def read(self):
-        ele_uncompressed = tempfile.TemporaryFile()
-        ele_uncompressed.write(zlib.decompress(self._stream.read()))
-        ele_uncompressed.seek(0)
+        if isinstance(self._stream, _BUFFER_TYPES):
+            compressed = self._stream
+        else:
+            compressed = self._stream.read()
 
-        raw = _BinaryStream(ele_uncompressed, True)
+        raw = _BinaryBuffer(zlib.decompress(compressed), True)
 
         ele = Element(raw)
         ele.read()
 
-        ele_uncompressed.close()
-
         return ele.get_dict()
 
 
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from .d2i import D2I
+from .d2o import _compile_class
+from collections import OrderedDict
+
+# Class itself
+
+
+class I18nResolver:
+    """Resolve the i18n ids of D2O objects against D2I files"""
+    def __init__(self, d2o_reader, d2i_streams):
+        """Init the class with a D2OReader and the streams of the D2I
+        files by language"""
+        # Attributes
+        self._d2o_reader = d2o_reader
+        self._d2i = OrderedDict((language, D2I(stream))
+                                for language, stream in d2i_streams.items())
+        self._ids = None
+        self._texts = dict((language, dict()) for language in self._d2i)
+
+    def get_ids(self):
+        """Return the sorted i18n ids used by the objects, collected in one
+        pass over the D2O without building the objects"""
+        if self._ids is None:
+            ids = set()
+            decoders = self._compile_decoders(
+                lambda names, fields: self._make_collector(fields, ids))
+            for obj in self._d2o_reader._iter_decoded(decoders):
+                pass
+            self._ids = sorted(ids)
+        return self._ids
+
+    def get_texts(self, language):
+        """Return the texts of all the i18n ids used by the objects, by id,
+        the ids without text being skipped"""
+        texts = self._fetch(language, self.get_ids())
+        return OrderedDict((text_id, texts[text_id]) for text_id in self._ids
+                           if texts[text_id] is not None)
+
+    def get_text(self, language, text_id):
+        return self._fetch(language, [text_id]).get(text_id)
+
+    def get_objects(self, language, suffix="Text"):
+        """Return the objects with the text of each i18n field in a field
+        named after it with suffix, None for ids without text"""
+        texts = self._fetch(language, self.get_ids())
+        decoders = self._compile_decoders(
+            lambda names, fields: self._make_attacher(names, fields, texts,
+                                                      suffix))
+        return list(self._d2o_reader._iter_decoded(decoders))
+
+    def _fetch(self, language, ids):
+        """Return the texts cache of a language after reading the texts of
+        the ids not in it, in one forward pass over the D2I"""
+        texts = self._texts[language]
+        missing = [text_id for text_id in ids if text_id not in texts]
+        if missing:
+            fetched = self._d2i[language].read_texts(missing)
+            for text_id in missing:
+                texts[text_id] = fetched.get(text_id)
+        return texts
+
+    def _compile_decoders(self, make_factory):
+        """Compile decoders for the classes of the D2O, building the objects
+        with make_factory(names, i18n fields), the i18n fields being the
+        (index, vector depth) of the fields holding i18n ids"""
+        decoders = dict()
+        for class_id, class_def in self._d2o_reader._classes.items():
+            schema = class_def.get_schema()
+            names = tuple(name for name, type_id, inner_type_ids in schema)
+            fields = list()
+            for index, (name, type_id, inner_type_ids) in enumerate(schema):
+                if type_id == -5:
+                    fields.append((index, 0))
+                elif type_id == -99 and inner_type_ids[-1] == -5:
+                    fields.append((index, len(inner_type_ids)))
+            decoders[class_id] = _compile_class(
+                schema, decoders, make_factory(names, fields))
+        return decoders
+
+    def _make_collector(self, fields, ids):
+        def make(values):
+            for index, depth in fields:
+                _collect(values[index], depth, ids)
+        return make
+
+    def _make_attacher(self, names, fields, texts, suffix):
+        text_names = [(index, depth, names[index] + suffix)
+                      for index, depth in fields]
+
+        def make(values):
+            obj = OrderedDict(zip(names, values))
+            for index, depth, name in text_names:
+                obj[name] = _resolve(values[index], depth, texts)
+            return obj
+        return make
+
+
+def _collect(value, depth, ids):
+    if not depth:
+        ids.add(value)
+    elif depth == 1:
+        ids.update(value)
+    else:
+        for item in value:
+            _collect(item, depth - 1, ids)
+
+
+def _resolve(value, depth, texts):
+    if not depth:
+        return texts.get(value)
+    return [_resolve(item, depth - 1, texts) for item in value]
@@ -1,7 +1,8 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from ._binarystream import _BinaryStream
+import shutil
+from ._binarystream import _BinaryStream, _BinaryBuffer, _BUFFER_TYPES
 
 # Exceptions
 
@@ -27,8 +28,11 @@ class SWLReader:
 
         self._SWF = None
 
-        # Load the SWL
-        SWL_file_binary = _BinaryStream(self._stream, True)
+        # Load the SWL, from a bytes-like object without copying the SWF
+        if isinstance(self._stream, _BUFFER_TYPES):
+            SWL_file_binary = _BinaryBuffer(self._stream, True)
+        else:
+            SWL_file_binary = _BinaryStream(self._stream, True)
 
         byte_header = SWL_file_binary.read_char()
         if byte_header == b"":
@@ -85,7 +89,7 @@ class SWLReader:
 
 
 class SWLBuilder:
-    """Build SWL files"""
+    """Build SWL files, the SWF can be given as bytes or as a stream"""
     def __init__(self, template, target):
         self._template = template
         self._target = target
@@ -104,7 +108,10 @@ class SWLBuilder:
         for class_ in self._template["classes"]:
             SWL_file_build_binary.write_string((class_).encode())
 
-        SWL_file_build_binary.write_bytes(self._SWF)
+        if hasattr(self._SWF, "read"):
+            shutil.copyfileobj(self._SWF, self._target)
+        else:
+            SWL_file_build_binary.write_bytes(self._SWF)
 
     # Mutators
 